@@ -0,0 +1,22 @@
+import pytest
+
+from src.game_config import GameConfig
+from src.game_field import GameField
+
+BOARD_SIZES = (5, 25, 100)
+
+
+@pytest.fixture(params=BOARD_SIZES, ids=lambda size: 'half_size=%d' % size)
+def config(request):
+    """ `GameConfig` with half of the field size the benchmark runs with.
+
+    """
+    return GameConfig(half_of_field_size=request.param)
+
+
+@pytest.fixture
+def field(config):
+    """ Headless `GameField` of `config`.
+
+    """
+    return GameField(config=config)
@@ -0,0 +1,101 @@
+""" Benchmarks of the simulation hot paths, run headless over several board
+sizes by
+
+    python -m pytest benchmarks
+
+"""
+from src.game_field import GameField
+from src.npc_figure import NPCFigure
+from src.occupancy_grid import GRASS_CELL
+from src.simulation import Simulation
+
+# Rounds of benchmarks needing a fresh state for every call.
+PEDANTIC_ROUNDS = 5
+
+
+def get_vertex(figure):
+    return figure.position_x, 0, figure.position_z
+
+
+def test_initialize(benchmark, config):
+    benchmark.pedantic(GameField, kwargs={'config': config}, rounds=PEDANTIC_ROUNDS)
+
+
+def test_quantify_game_field(benchmark, field):
+    benchmark(field.tracing_helper.quantify_game_field)
+
+
+def test_do_dijkstra(benchmark, field):
+    tracing_helper = field.tracing_helper
+    start = get_vertex(field.npc_figures[0])
+    destination = get_vertex(field.player_figure)
+
+    # Cached paths are dropped before every round so the search itself is measured.
+    path = benchmark.pedantic(tracing_helper.do_dijkstra, args=(start, destination),
+                              setup=tracing_helper._path_cache.clear, rounds=PEDANTIC_ROUNDS)
+
+    assert path
+
+
+def test_check_if_figure_collide(benchmark, field):
+    positions = [(x + 0.3, z - 0.3) for x in range(-2, 3) for z in range(-2, 3)]
+
+    def check_all():
+        for position_x, position_z in positions:
+            field.check_if_figure_collide(position_x, position_z)
+
+    benchmark(check_all)
+
+
+def test_calculate_affection_of_bomb(benchmark, field):
+    bomb = field.player_figure.place_bomb()
+
+    benchmark(bomb.calculate_affection_of_bomb, field.grid)
+
+    assert bomb.positions_affected_by_bomb
+
+
+def test_check_if_hit_npcs(benchmark, field):
+    n = field.config.half_of_field_size
+
+    # Hundreds of NPC figures spread over the field.
+    for index in range(300):
+        figure = NPCFigure(index % (2 * n + 1) - n, (index * 7) % (2 * n + 1) - n, field.config)
+        field.npc_figures.append(figure)
+        field.npc_index.add(figure)
+
+    cells = [(x, z) for x in range(-n, n + 1) for z in range(-3, 4)]
+
+    def check_all():
+        for x, z in cells:
+            field.check_if_hit_npcs(x, z)
+
+    benchmark(check_all)
+
+
+def test_detonation(benchmark, field):
+    shown = dict(field.shown)
+
+    def setup():
+        for position in shown.keys() - field.shown.keys():
+            field.show_block(position)
+
+        field.add_bomb(field.player_figure.place_bomb())
+
+    benchmark.pedantic(field.detonation, args=(0,), setup=setup, rounds=PEDANTIC_ROUNDS * 4)
+
+
+def test_find_escape_path(benchmark, field):
+    simulation = Simulation(field)
+
+    # Grass is cleared so the figure is not trapped next to its own bomb.
+    for x, y, z in list(field.shown):
+        if y == 0 and field.grid.get(x, z) == GRASS_CELL:
+            field.remove_block((x, y, z))
+
+    figure = field.npc_figures[0]
+    field.add_bomb(figure.place_bomb())
+
+    path = benchmark(simulation.find_escape_path, figure)
+
+    assert path
@@ -1,58 +1,454 @@
-import numpy as np
-from pyglet.gl import *
-
-class ObjLoader:
-    def __init__(self):
-        self.vert_coords = []
-        self.text_coords = []
-        self.norm_coords = []
-
-        self.vertex_index = []
-        self.texture_index = []
-        self.normal_index = []
-
-        self.model = []
-        self.c_model = None
-
-    def load_model(self, file):
-        for line in open(file, 'r'):
-            if line.startswith('#'): continue
-            values = line.split()
-            if not values: continue
-
-            if values[0] == 'v':
-                self.vert_coords.append(values[1:4])
-            if values[0] == 'vt':
-                self.text_coords.append(values[1:3])
-            if values[0] == 'vn':
-                self.norm_coords.append(values[1:4])
-
-            if values[0] == 'f':
-                face_i = []
-                text_i = []
-                norm_i = []
-                for v in values[1:4]:
-                    w = v.split('/')
-                    face_i.append(int(w[0])-1)
-                    text_i.append(int(w[1])-1)
-                    norm_i.append(int(w[2])-1)
-                self.vertex_index.append(face_i)
-                self.texture_index.append(text_i)
-                self.normal_index.append(norm_i)
-
-        self.vertex_index = [y for x in self.vertex_index for y in x]
-        self.texture_index = [y for x in self.texture_index for y in x]
-        self.normal_index = [y for x in self.normal_index for y in x]
-
-        for i in self.vertex_index:
-            self.model.extend(self.vert_coords[i])
-
-        for i in self.texture_index:
-            self.model.extend(self.text_coords[i])
-
-        for i in self.normal_index:
-            self.model.extend(self.norm_coords[i])
-
-        self.model = np.array(self.model, dtype='float32')
-
-        self.c_model = (GLfloat * len(self.model))(*self.model)
\ No newline at end of file
+import ctypes
+import itertools
+import os
+from array import array
+from collections import namedtuple
+
+import numpy as np
+from pyglet.gl import GLfloat, GLuint, GLushort
+
+# Directory next to the model file holding parsed models, see `ObjLoader.load_model()`.
+CACHE_DIR_NAME = '.model_cache'
+
+# Count of floats per vertex of the interleaved array built by `ObjLoader.load_indexed_model()`.
+VERTEX_SIZE = 8
+
+# Offsets in floats of position, texture coordinates and normal inside an interleaved vertex.
+POSITION_OFFSET = 0
+TEXTURE_OFFSET = 3
+NORMAL_OFFSET = 5
+
+# Count of lines `iter_obj()` reads at once, bounds memory held by unparsed text.
+CHUNK_LINES = 65536
+
+# Count of numbers of each coordinate kind used from its line.
+COORDINATE_SIZES = {'v': 3, 'vt': 2, 'vn': 3}
+
+# Range of face corners [first, first + count) sharing object or group `name` and `material`.
+Submesh = namedtuple('Submesh', 'name, material, first, count')
+
+
+def get_cache_path(file, kind):
+    """ Return path of the cached array `kind` parsed from model `file`. The
+    name contains modification time and size of `file`, so editing the model
+    makes the old cache unused.
+
+    """
+    stat = os.stat(file)
+    directory, name = os.path.split(os.path.abspath(file))
+
+    return os.path.join(directory, CACHE_DIR_NAME, '%s.%s.%d-%d.npy' % (name, kind, stat.st_mtime_ns, stat.st_size))
+
+
+def load_cached(file, kind):
+    """ Return memory mapped array `kind` cached for model `file`, None if
+    there is no up to date cache.
+
+    """
+    path = get_cache_path(file, kind)
+
+    if not os.path.exists(path):
+        return None
+
+    return np.load(path, mmap_mode='r')
+
+
+def save_cached(file, kind, data):
+    """ Store `data` array as the cached array `kind` of model `file`, replacing
+    caches of older versions of the model. Failing to write the cache is not
+    an error, the model is parsed again next time.
+
+    """
+    path = get_cache_path(file, kind)
+    directory, name = os.path.split(path)
+    prefix = '%s.%s.' % (os.path.basename(file), kind)
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+
+        for old_name in os.listdir(directory):
+            if old_name.startswith(prefix) and old_name != name:
+                os.remove(os.path.join(directory, old_name))
+
+        temporary_path = '%s.%d.tmp' % (path, os.getpid())
+
+        with open(temporary_path, 'wb') as cache_file:
+            np.save(cache_file, data)
+
+        os.replace(temporary_path, path)
+    except OSError:
+        pass
+
+
+def parse_numbers(lines, count, dtype):
+    """ Return array of shape (len(lines), count) with the first `count`
+    numbers of each line. Lines holding exactly `count` numbers are parsed
+    at once.
+
+    """
+    data = np.fromstring(' '.join(lines), dtype=dtype, sep=' ')
+
+    if data.size != len(lines) * count:
+        data = np.fromstring(' '.join(' '.join(line.split()[:count]) for line in lines), dtype=dtype, sep=' ')
+
+    return data.reshape(-1, count)
+
+
+def parse_corner(token, counts):
+    """ Return zero based (v, vt, vn) indices of face corner `token` given
+    as v, v/vt, v//vn or v/vt/vn, a missing index is -1. Negative indices
+    are relative to `counts` of v, vt and vn read so far.
+
+    """
+    result = []
+    values = token.split('/')
+
+    for kind in range(3):
+        value = values[kind] if kind < len(values) else ''
+
+        if not value:
+            result.append(-1)
+        else:
+            index = int(value)
+            result.append(index - 1 if index > 0 else counts[kind] + index)
+
+    return tuple(result)
+
+
+def triangulate(corners):
+    """ Yield triangles of a fan splitting convex polygon given by list of
+    `corners`.
+
+    """
+    for index in range(1, len(corners) - 1):
+        yield corners[0], corners[index], corners[index + 1]
+
+
+def parse_faces(faces):
+    """ Return int32 array of shape (count, 3) with zero based (v, vt, vn)
+    indices of corners of triangles the faces are split into.
+
+    Parameters
+    ----------
+    faces : list of tuples
+        Text of each face line after the keyword together with counts of
+        v, vt and vn read before it.
+
+    """
+    text = ' '.join(face for face, _ in faces)
+
+    # Triangles with all corners given as v/vt/vn by absolute indices are parsed at once.
+    if text.count('/') == 6 * len(faces) and '//' not in text and '-' not in text:
+        data = np.fromstring(text.replace('/', ' '), dtype=np.int32, sep=' ')
+
+        if data.size == 9 * len(faces):
+            return data.reshape(-1, 3) - 1
+
+    corners = array('i')
+
+    # Mapping from corner token to its indices, tokens with relative indices are not stored.
+    parsed_corners = {}
+
+    for face, counts in faces:
+        polygon = []
+
+        for token in face.split():
+            corner = parsed_corners.get(token)
+
+            if corner is None:
+                corner = parse_corner(token, counts)
+
+                if '-' not in token:
+                    parsed_corners[token] = corner
+
+            polygon.append(corner)
+
+        for triangle in triangulate(polygon):
+            for corner in triangle:
+                corners.extend(corner)
+
+    return np.frombuffer(corners, dtype=np.int32).reshape(-1, 3)
+
+
+def iter_obj(file, chunk_lines=CHUNK_LINES):
+    """ Stream OBJ `file`, reading at most `chunk_lines` lines at once so
+    memory does not grow with the size of the file.
+
+    Faces are triangulated. Object, group and material of faces are taken
+    from the last `o`, `g` and `usemtl` lines.
+
+    Yields
+    ------
+    kind : str
+        'v', 'vt' or 'vn' for coordinates, 'f' for faces.
+    data : numpy.ndarray or tuple
+        Array of coordinates read from a chunk, shape (count, 3) for 'v'
+        and 'vn' and (count, 2) for 'vt'. For 'f' a tuple (name, material,
+        corners) where `corners` is int32 array of shape (count, 3) with
+        zero based (v, vt, vn) indices of triangle corners, -1 where the
+        corner has no vt or vn.
+
+    """
+    counts = [0, 0, 0]
+    kinds = ('v', 'vt', 'vn')
+    object_name = group_name = material = ''
+
+    with open(file, 'r') as obj_file:
+        while True:
+            lines = list(itertools.islice(obj_file, chunk_lines))
+
+            if not lines:
+                break
+
+            coordinates = {kind: [] for kind in kinds}
+
+            # Faces of the chunk as list of (name, material, faces for `parse_faces()`).
+            segments = []
+            faces = None
+
+            for line in lines:
+                values = line.split(None, 1)
+
+                if not values:
+                    continue
+
+                keyword = values[0]
+                rest = values[1] if len(values) > 1 else ''
+
+                if keyword in coordinates:
+                    coordinates[keyword].append(rest)
+                    counts[kinds.index(keyword)] += 1
+
+                elif keyword == 'f':
+                    if faces is None:
+                        faces = []
+                        segments.append((group_name or object_name, material, faces))
+
+                    faces.append((rest, tuple(counts)))
+
+                elif keyword in ('o', 'g', 'usemtl'):
+                    if keyword == 'o':
+                        object_name, group_name = rest.strip(), ''
+                    elif keyword == 'g':
+                        group_name = rest.strip()
+                    else:
+                        material = rest.strip()
+
+                    faces = None
+
+            for kind in kinds:
+                if coordinates[kind]:
+                    yield kind, parse_numbers(coordinates[kind], COORDINATE_SIZES[kind], np.float32)
+
+            for name, material_name, faces in segments:
+                yield 'f', (name, material_name, parse_faces(faces))
+
+
+def gather(coordinates, indices):
+    """ Return rows of `coordinates` at `indices`, rows of zeros where the
+    index is -1.
+
+    """
+    # Index -1 selects the appended row of zeros.
+    padded = np.vstack((coordinates, np.zeros((1, coordinates.shape[1]), dtype=coordinates.dtype)))
+
+    return padded[indices]
+
+
+def submeshes_to_array(submeshes):
+    """ Convert list of `Submesh` to a structured array stored in the cache.
+
+    """
+    text_size = max([1] + [len(submesh.name) for submesh in submeshes] + [len(submesh.material) for submesh in submeshes])
+    dtype = [('name', 'U%d' % text_size), ('material', 'U%d' % text_size), ('first', np.int64), ('count', np.int64)]
+
+    return np.array([tuple(submesh) for submesh in submeshes], dtype=dtype)
+
+
+def array_to_submeshes(data):
+    return [Submesh(str(name), str(material), int(first), int(count)) for name, material, first, count in data]
+
+
+class ObjLoader:
+    def __init__(self):
+        self.vert_coords = []
+        self.text_coords = []
+        self.norm_coords = []
+
+        self.vertex_index = []
+        self.texture_index = []
+        self.normal_index = []
+
+        # Positions of all face corners followed by their texture coordinates
+        # and normals, read-only when loaded from the cache.
+        self.model = []
+
+        # Pointer to data of `model` passed to OpenGL, shares memory with it.
+        self.c_model = None
+
+        # Interleaved position, texture coordinates and normal of every unique
+        # face corner, shape (count, VERTEX_SIZE).
+        self.vertices = None
+
+        # Indices into `vertices` of all face corners, uint16 when they fit.
+        self.indices = None
+
+        # Pointers to data of `vertices` and `indices` passed to OpenGL.
+        self.c_vertices = None
+        self.c_indices = None
+
+        # List of `Submesh`, ranges of face corners of each object, group and
+        # material, in order of the file.
+        self.submeshes = []
+
+    def load_model(self, file, use_cache=True):
+        """ Load triangles of the OBJ `file` into `model`. Coordinates and
+        indices parsed from the file are only kept when it was parsed, not
+        when the model came from the cache.
+
+        Parameters
+        ----------
+        file : str
+            Path to the OBJ file.
+        use_cache : bool
+            Whether or not to memory map the model parsed by a previous call
+            instead of parsing the file again, the parsed model is cached
+            for the next call.
+
+        """
+        model, submeshes = self._load(file, ('model', 'submeshes'), lambda: (self.build_model(),), use_cache)
+
+        self.model = model
+        self.c_model = ctypes.cast(model.ctypes.data, ctypes.POINTER(GLfloat))
+        self.submeshes = array_to_submeshes(submeshes)
+
+    def load_indexed_model(self, file, use_cache=True):
+        """ Load triangles of the OBJ `file` into `vertices` and `indices`.
+        Face corners with the same position, texture coordinates and normal
+        share a single vertex.
+
+        Parameters
+        ----------
+        file : str
+            Path to the OBJ file.
+        use_cache : bool
+            Whether or not to memory map arrays built by a previous call
+            instead of parsing the file again.
+
+        """
+        vertices, indices, submeshes = self._load(file, ('vertices', 'indices', 'submeshes'),
+                                                  self.build_indexed_model, use_cache)
+
+        self.vertices = vertices
+        self.indices = indices
+        self.submeshes = array_to_submeshes(submeshes)
+
+        index_type = GLushort if indices.dtype == np.uint16 else GLuint
+
+        self.c_vertices = ctypes.cast(vertices.ctypes.data, ctypes.POINTER(GLfloat))
+        self.c_indices = ctypes.cast(indices.ctypes.data, ctypes.POINTER(index_type))
+
+    def _load(self, file, kinds, build, use_cache):
+        """ Return cached arrays `kinds` of model `file`. If any of them is
+        not cached, the file is parsed and arrays returned by `build()`
+        together with the submesh table are cached instead.
+
+        """
+        arrays = [load_cached(file, kind) for kind in kinds] if use_cache else [None]
+
+        if any(data is None for data in arrays):
+            self.parse(file)
+            arrays = tuple(build()) + (submeshes_to_array(self.submeshes),)
+
+            if use_cache:
+                for kind, data in zip(kinds, arrays):
+                    save_cached(file, kind, data)
+
+        return arrays
+
+    def parse(self, file):
+        """ Parse coordinates, triangles and submeshes of the OBJ `file`
+        streamed by `iter_obj()`.
+
+        """
+        coordinates = {'v': [], 'vt': [], 'vn': []}
+        corners = []
+        self.submeshes = []
+        first = 0
+
+        for kind, data in iter_obj(file):
+            if kind != 'f':
+                coordinates[kind].append(data)
+                continue
+
+            name, material, face_corners = data
+            last = self.submeshes[-1] if self.submeshes else None
+
+            if last is not None and last.name == name and last.material == material:
+                self.submeshes[-1] = last._replace(count=last.count + len(face_corners))
+            else:
+                self.submeshes.append(Submesh(name, material, first, len(face_corners)))
+
+            corners.append(face_corners)
+            first += len(face_corners)
+
+        self.vert_coords, self.text_coords, self.norm_coords = (
+            np.concatenate(coordinates[kind]) if coordinates[kind] else
+            np.zeros((0, COORDINATE_SIZES[kind]), dtype=np.float32) for kind in ('v', 'vt', 'vn'))
+
+        corners = np.concatenate(corners) if corners else np.zeros((0, 3), dtype=np.int32)
+
+        self.vertex_index = corners[:, 0]
+        self.texture_index = corners[:, 1]
+        self.normal_index = corners[:, 2]
+
+    def build_model(self):
+        """ Return flat float32 array with positions of all parsed face
+        corners followed by their texture coordinates and normals. Missing
+        texture coordinates and normals are zeros.
+
+        """
+        return np.concatenate((gather(self.vert_coords, self.vertex_index).ravel(),
+                               gather(self.text_coords, self.texture_index).ravel(),
+                               gather(self.norm_coords, self.normal_index).ravel()))
+
+    def build_indexed_model(self):
+        """ Return interleaved vertex array of unique parsed face corners and
+        index array of all face corners into it. Vertices keep the order in
+        which the corners first appear in the file.
+
+        """
+        corners = np.stack((self.vertex_index, self.texture_index, self.normal_index), axis=1)
+        unique, first, inverse = np.unique(corners, axis=0, return_index=True, return_inverse=True)
+
+        order = np.argsort(first)
+        ranks = np.empty_like(order)
+        ranks[order] = np.arange(len(order))
+        unique = unique[order]
+
+        vertices = np.hstack((gather(self.vert_coords, unique[:, 0]),
+                              gather(self.text_coords, unique[:, 1]),
+                              gather(self.norm_coords, unique[:, 2])))
+
+        index_dtype = np.uint16 if len(vertices) <= np.iinfo(np.uint16).max + 1 else np.uint32
+
+        return vertices, ranks[inverse.ravel()].astype(index_dtype)
+
+    def get_reduction_stats(self):
+        """ Return dictionary comparing the indexed model to the expanded
+        one: counts of face corners and unique vertices, the fraction of
+        vertices saved and sizes in bytes of both representations.
+
+        """
+        corners = len(self.indices)
+        unique_vertices = len(self.vertices)
+        expanded_bytes = corners * VERTEX_SIZE * np.dtype(np.float32).itemsize
+        indexed_bytes = self.vertices.nbytes + self.indices.nbytes
+
+        return {
+            'corners': corners,
+            'unique_vertices': unique_vertices,
+            'vertex_reduction': 1.0 - unique_vertices / corners if corners else 0.0,
+            'expanded_bytes': expanded_bytes,
+            'indexed_bytes': indexed_bytes,
+        }
@@ -1,23 +1,94 @@
 import math
 
+import numpy as np
 from past.builtins import xrange
-from pyglet.gl import GLfloat
 
 from src.game_config import *
 
 
+# Signs of vertex coordinates of a cube centered at origin, faces ordered as in `FACES`.
+CUBE_SIGNS = (
+    ((-1, 1, -1), (-1, 1, 1), (1, 1, 1), (1, 1, -1)),  # top
+    ((-1, -1, -1), (1, -1, -1), (1, -1, 1), (-1, -1, 1)),  # bottom
+    ((-1, -1, -1), (-1, -1, 1), (-1, 1, 1), (-1, 1, -1)),  # left
+    ((1, -1, 1), (1, -1, -1), (1, 1, -1), (1, 1, 1)),  # right
+    ((-1, -1, 1), (1, -1, 1), (1, 1, 1), (-1, 1, 1)),  # front
+    ((1, -1, -1), (-1, -1, -1), (-1, 1, -1), (1, 1, -1)),  # back
+)
+
+# Mapping from half size to the cube template of that size, see `cube_template()`.
+_cube_templates = {}
+
+
+def cube_template(n):
+    """ Return read-only float32 array of shape (6, 4, 3) with vertices of the
+    cube at origin with size 2*n, faces ordered as in `FACES`.
+
+    """
+    template = _cube_templates.get(n)
+
+    if template is None:
+        template = np.array(CUBE_SIGNS, dtype=np.float32) * np.float32(n)
+        template.setflags(write=False)
+        _cube_templates[n] = template
+
+    return template
+
+
 def cube_vertices(x, y, z, n):
     """ Return the vertices of the cube at position x, y, z with size 2*n.
 
     """
-    return [
-        x-n,y+n,z-n, x-n,y+n,z+n, x+n,y+n,z+n, x+n,y+n,z-n,  # top
-        x-n,y-n,z-n, x+n,y-n,z-n, x+n,y-n,z+n, x-n,y-n,z+n,  # bottom
-        x-n,y-n,z-n, x-n,y-n,z+n, x-n,y+n,z+n, x-n,y+n,z-n,  # left
-        x+n,y-n,z+n, x+n,y-n,z-n, x+n,y+n,z-n, x+n,y+n,z+n,  # right
-        x-n,y-n,z+n, x+n,y-n,z+n, x+n,y+n,z+n, x-n,y+n,z+n,  # front
-        x+n,y-n,z-n, x-n,y-n,z-n, x-n,y+n,z-n, x+n,y+n,z-n,  # back
-    ]
+    return (cube_template(n) + (x, y, z)).ravel().tolist()
+
+
+def cubes_vertices(positions, n, faces=None):
+    """ Return vertices of cubes with size 2*n at all `positions` at once.
+
+    Parameters
+    ----------
+    positions : array like of shape (count, 3)
+        The (x, y, z) positions of the cubes.
+    n : float
+        Half of the cube size.
+    faces : array of bools of shape (count, 6), optional
+        Faces of each cube to include, all faces by default.
+
+    Returns
+    -------
+    vertices : float32 array of shape (vertex count, 3)
+
+    """
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 1, 1, 3)
+    vertices = cube_template(n) + positions
+
+    if faces is not None:
+        vertices = vertices[faces]
+
+    return vertices.reshape(-1, 3)
+
+
+def cubes_tex_coords(textures, faces=None):
+    """ Return texture coordinates matching `cubes_vertices()`.
+
+    Parameters
+    ----------
+    textures : array like of shape (count, 48)
+        Texture coordinates of each cube generated by `tex_coords()`.
+    faces : array of bools of shape (count, 6), optional
+        Faces of each cube to include, all faces by default.
+
+    Returns
+    -------
+    tex_coords : float32 array of shape (vertex count, 2)
+
+    """
+    tex_coords = np.asarray(textures, dtype=np.float32).reshape(-1, 6, 8)
+
+    if faces is not None:
+        tex_coords = tex_coords[faces]
+
+    return tex_coords.reshape(-1, 2)
 
 
 def get_int_from_float(float_nr):
@@ -65,12 +136,13 @@ def normalize(position):
     return x, y, z
 
 
-def sectorize(position):
+def sectorize(position, sector_size=SECTOR_SIZE):
     """ Returns a tuple representing the sector for the given `position`.
 
     Parameters
     ----------
     position : tuple of len 3
+    sector_size : int
 
     Returns
     -------
@@ -78,7 +150,7 @@ def sectorize(position):
 
     """
     x, y, z = normalize(position)
-    x, y, z = x // SECTOR_SIZE, y // SECTOR_SIZE, z // SECTOR_SIZE
+    x, y, z = x // sector_size, y // sector_size, z // sector_size
     return x, 0, z
 
 
@@ -125,8 +197,7 @@ def rotate(origin, point, angle):
     return qx, qy
 
 
-def get_positions_list():
-    n = HALF_OF_FIELD_SIZE
+def get_positions_list(n=HALF_OF_FIELD_SIZE):
     s = 1  # step size
     y = 0  # initial y height
 
@@ -139,4 +210,6 @@ def get_positions_list():
     return result
 
 def vec(*args):
+    from pyglet.gl import GLfloat
+
     return (GLfloat * len(args))(*args)
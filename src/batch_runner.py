@@ -0,0 +1,124 @@
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from src.game_config import GameConfig
+from src.simulation import Simulation, GAME_WON, GAME_LOST
+
+GAME_UNDECIDED = 'undecided'
+
+
+def run_match(config):
+    """ Play one headless match and return its statistics.
+
+    Parameters
+    ----------
+    config : dict
+        Optional keys `game_config` (`GameConfig` of the match), `overrides`
+        (dictionary of options replaced in the game config), `max_time`
+        (game time limit in seconds) and `steps_per_sec` (count of
+        simulation steps per second of game time). Time limit and steps
+        default to the game config.
+
+    Returns
+    -------
+    result : dict
+        The `config`, the result of the match (GAME_WON, GAME_LOST or
+        GAME_UNDECIDED), count of steps, game time and real time in seconds.
+
+    """
+    game_config = config.get('game_config') or GameConfig()
+    game_config = game_config.replace(**config.get('overrides', {}))
+
+    max_time = config.get('max_time', game_config.match_max_secs)
+    steps_per_sec = config.get('steps_per_sec', game_config.steps_per_sec)
+
+    start = time.perf_counter()
+
+    simulation = Simulation(config=game_config)
+    result = simulation.run(max_time, 1.0 / steps_per_sec)
+
+    return {
+        'config': config,
+        'result': result if result is not None else GAME_UNDECIDED,
+        'steps': simulation.steps,
+        'game_time': simulation.field.elapsed_time,
+        'real_time': time.perf_counter() - start,
+    }
+
+
+def run_many(configs, workers=None):
+    """ Play a match for every config in `configs` on a pool of `workers`
+    processes, all cores by default. Results of `run_match()` are yielded as
+    soon as each match finishes, not in order of `configs`.
+
+    `configs` may be any iterable, including a generator. It is consumed
+    lazily, at most twice as many matches as workers are submitted at once,
+    so memory use does not grow with the count of matches.
+
+    """
+    workers = workers or os.cpu_count() or 1
+    configs = iter(configs)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(run_match, config) for config in itertools.islice(configs, workers * 2)}
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                yield future.result()
+
+            pending.update(executor.submit(run_match, config) for config in itertools.islice(configs, len(done)))
+
+
+def summarize(results):
+    """ Return counts of won, lost and undecided matches together with mean
+    count of steps per match.
+
+    """
+    summary = {GAME_WON: 0, GAME_LOST: 0, GAME_UNDECIDED: 0, 'matches': 0, 'mean_steps': 0.0}
+    steps = 0
+
+    for result in results:
+        summary[result['result']] += 1
+        summary['matches'] += 1
+        steps += result['steps']
+
+    if summary['matches']:
+        summary['mean_steps'] = steps / summary['matches']
+
+    return summary
+
+
+def print_result(result):
+    """ Print one line about finished match `result` and return it.
+
+    """
+    print('%s after %d steps (%.3f s)' % (result['result'], result['steps'], result['real_time']))
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play headless Bomberman matches in parallel.')
+    parser.add_argument('--matches', type=int, default=100, help='count of matches to play')
+    parser.add_argument('--workers', type=int, default=None, help='count of worker processes')
+    parser.add_argument('--max-time', type=float, default=None, help='game time limit of a match')
+    GameConfig.add_arguments(parser)
+    args = parser.parse_args()
+
+    game_config = GameConfig.from_args(args)
+
+    if args.max_time is not None:
+        game_config = game_config.replace(match_max_secs=args.max_time)
+
+    configs = ({'game_config': game_config} for _ in range(args.matches))
+
+    print(summarize(print_result(result) for result in run_many(configs, args.workers)))
+
+
+if __name__ == '__main__':
+    main()
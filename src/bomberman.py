@@ -1,37 +1,41 @@
 from __future__ import division
 
+import argparse
+
+import pyglet
 from pyglet.gl import *
 from pyglet.window import key
 
 from src.basic_helpers import *
+from src.field_renderer import FieldRenderer
 from src.game_field import GameField
 from src.game_config import *
-from src.tracing_helper import TracingHelper
+from src.profiler import Profiler
+from src.simulation import Simulation, GAME_WON, GAME_LOST
+from src.tick_scheduler import TickScheduler
 
 
 class Window(pyglet.window.Window):
 
     def __init__(self, *args, **kwargs):
+        game_config = kwargs.pop('game_config', None)
+
         super(Window, self).__init__(*args, **kwargs)
 
+        # `GameConfig` of the played match, `config` is the GL config of the window.
+        self.game_config = game_config if game_config is not None else GameConfig()
+
         # Whether or not the window exclusively captures the mouse.
         self.exclusive = False
 
         self.fullscreen_request = False
 
-        # Strafing is moving lateral to the direction you are facing,
-        # e.g. moving to the left or right while continuing to face forward.
-        #
-        # First element is -1 when moving forward, 1 when moving back, and 0
-        # otherwise. The second element is -1 when moving left, 1 when moving
-        # right, and 0 otherwise.
-        self.strafe = [0, 0]
-
         # Current (x, y, z) position in the world, specified with floats. Note
         # that, perhaps unlike in math class, the y-axis is the vertical axis.
         self.position = (STARTING_POSITION_X, STARTING_POSITION_Y, STARTING_POSITION_Z)
 
-        self.spectator_distance_to_center = pythagoras_get_c(HALF_OF_FIELD_SIZE, HALF_OF_FIELD_SIZE)
+        self.spectator_distance_to_center = pythagoras_get_c(self.game_config.half_of_field_size,
+                                                             self.game_config.half_of_field_size)
 
         # First element is rotation of the player in the x-z plane (ground
         # plane) measured from the z-axis down. The second is the rotation
@@ -53,12 +57,20 @@ class Window(pyglet.window.Window):
         # Velocity in the y (upward) direction.
         self.dy = 0
 
-        self.player_wants_place_bomb = False
+        # Draws the game field.
+        self.renderer = FieldRenderer(sector_size=self.game_config.sector_size)
 
-        self.game_stopped = False
+        # Measures time spent in the game loop, shown by the profiler overlay.
+        self.profiler = Profiler()
+
+        # Whether or not the profiler overlay is shown.
+        self.show_profiler = False
+
+        # Game logic, the window only renders its state and forwards input.
+        self.simulation = Simulation(GameField(self.renderer, self.profiler, self.game_config))
 
         # Instance of the model that handles the world.
-        self.model = GameField()
+        self.model = self.simulation.field
 
         # The label that is displayed in the top left of the canvas.
         self.label = pyglet.text.Label('', font_name='Arial', font_size=18,
@@ -67,9 +79,17 @@ class Window(pyglet.window.Window):
         self.status = pyglet.text.Label('', font_name='Arial', font_size=50, x=self.width//2, y=self.height//2,
                                         anchor_x='center', anchor_y='center', color=(0, 0, 0, 255))
 
+        self.profiler_label = pyglet.text.Label('', font_name='Courier New', font_size=12, x=10, y=self.height - 50,
+                                                width=600, multiline=True, anchor_x='left', anchor_y='top',
+                                                color=(0, 0, 0, 255))
+
+        # Runs `_update()` in fixed steps of game time.
+        self.scheduler = TickScheduler(self._update, self.game_config.steps_per_sec, self.game_config.max_catch_up_secs,
+                                       1.0 / self.game_config.ticks_per_sec)
+
         # This call schedules the `update()` method to be called
-        # TICKS_PER_SEC. This is the main game event loop.
-        pyglet.clock.schedule_interval(self.update, 1.0 / TICKS_PER_SEC)
+        # `ticks_per_sec` of the config. This is the main game event loop.
+        pyglet.clock.schedule_interval(self.update, 1.0 / self.game_config.ticks_per_sec)
 
     def set_exclusive_mouse(self, exclusive):
         """ If `exclusive` is True, the game will capture the mouse, if False
@@ -143,11 +163,11 @@ class Window(pyglet.window.Window):
 
     def game_over(self):
         self.status.text = 'Game Over!'
-        self.game_stopped = True
+        self.simulation.game_stopped = True
 
     def game_win(self):
         self.status.text = 'Win!'
-        self.game_stopped = True
+        self.simulation.game_stopped = True
 
     def update(self, dt):
         """ This method is scheduled to be called repeatedly by the pyglet
@@ -159,22 +179,25 @@ class Window(pyglet.window.Window):
             The change in time since the last call.
 
         """
-        self.model.process_queue()
-        sector = sectorize(self.position)
+        self.renderer.set_camera_position(self.position)
+
+        with self.profiler.measure('process_queue'):
+            self.renderer.process_queue()
+
+        with self.profiler.measure('particles'):
+            self.renderer.update_particles(dt)
+
+        sector = sectorize(self.position, self.game_config.sector_size)
 
         if sector != self.sector:
-            self.model.change_sectors(self.sector, sector)
+            self.renderer.change_sectors(sector)
 
             if self.sector is None:
-                self.model.process_entire_queue()
+                self.renderer.process_entire_queue()
 
             self.sector = sector
 
-        m = 8
-        dt = min(dt, 0.2)
-
-        for _ in xrange(m):
-            self._update(dt / m)
+        self.scheduler.tick(dt)
 
     def _update(self, dt):
         """ Private implementation of the `update()` method. This is where most
@@ -186,11 +209,11 @@ class Window(pyglet.window.Window):
             The change in time since the last call.
 
         """
-        if all(figure.hit for figure in self.model.npc_figures): self.game_win()
-        #if self.model.player_figure.hit: self.game_over()
+        with self.profiler.measure('update'):
+            self.simulation.step(dt)
 
-        self.move_figures(dt)
-        self.place_bombs()
+        if self.simulation.result == GAME_WON: self.game_win()
+        #if self.simulation.result == GAME_LOST: self.game_over()
 
         self.if_needed_rotate_horizontally()
         self.if_needed_rotate_vertically()
@@ -205,195 +228,6 @@ class Window(pyglet.window.Window):
             self.rotation = (STARTING_ROTATION_X, STARTING_ROTATION_Y)
             self.reset_spectator = False
 
-    def move_figures(self, dt):
-        distance = dt * WALKING_SPEED  # distance covered this tick.
-
-        self.npcs_action(distance)
-
-        if self.strafe[0] != 0 or self.strafe[1] != 0:
-            new_x = self.model.player_figure.position_x
-            new_z = self.model.player_figure.position_z
-
-            if self.strafe[0] == 1:  # right
-                new_x += distance
-            elif self.strafe[0] == -1:
-                new_x -= distance
-
-            if self.strafe[1] == 1:  # top
-                new_z += distance
-            elif self.strafe[1] == -1:
-                new_z -= distance
-
-            if not self.model.check_if_figure_collide(new_x, new_z):
-                self.model.player_figure.position_x = new_x
-                self.model.player_figure.position_z = new_z
-
-                self.model.player_figure.recalculate_vertices()
-
-    def npcs_action(self, distance):
-        for figure in self.model.npc_figures:
-            running_away = False
-
-            for bomb in self.model.bombs:
-                if any(round(figure.position_x) == position[0] and
-                       round(figure.position_z) == position[1]
-                       for position in bomb.positions_affected_by_bomb):
-
-                    running_away = self.escape_with_figure(bomb, figure, distance)
-
-            if not running_away:
-                self.place_bombs_with_figure(figure, distance)
-
-    def place_bombs_with_figure(self, figure, distance):
-        coef = 0.5
-
-        path = self.model.tracing_helper\
-            .do_dijkstra((figure.position_x, 0, figure.position_z),
-                         (self.model.player_figure.position_x, 0, self.model.player_figure.position_z))
-
-        x, z = self.model.tracing_helper.get_direction_from_path(path)
-
-        if x == -1:
-            rounded_x = round(figure.position_x - distance)
-
-            if not self.model.check_if_figure_collide(rounded_x - coef, figure.position_z) and \
-               not self.is_position_affected_by_any_bomb(rounded_x, figure.position_z):
-                figure.position_x -= distance
-                figure.recalculate_vertices()
-            else:
-                return self.npc_place_bomb(figure)
-
-        if x == 1:
-            rounded_x = round(figure.position_x + distance)
-
-            if not self.model.check_if_figure_collide(rounded_x + coef, figure.position_z) and \
-               not self.is_position_affected_by_any_bomb(rounded_x, figure.position_z):
-                figure.position_x += distance
-                figure.recalculate_vertices()
-            else:
-                return self.npc_place_bomb(figure)
-
-        if z == -1:
-            rounded_z = round(figure.position_z - distance)
-
-            if not self.model.check_if_figure_collide(figure.position_x, rounded_z - coef) and \
-               not self.is_position_affected_by_any_bomb(figure.position_x, rounded_z):
-                figure.position_z -= distance
-                figure.recalculate_vertices()
-            else:
-                return self.npc_place_bomb(figure)
-
-        if z == 1:
-            rounded_z = round(figure.position_z + distance)
-
-            if not self.model.check_if_figure_collide(figure.position_x, rounded_z + coef) and \
-               not self.is_position_affected_by_any_bomb(figure.position_x, rounded_z):
-                figure.position_z += distance
-                figure.recalculate_vertices()
-            else:
-                return self.npc_place_bomb(figure)
-
-    def is_position_affected_by_any_bomb(self, x, z):
-        for bomb in self.model.bombs:
-            if any(round(x) == position[0] and
-                   round(z) == position[1]
-                   for position in bomb.positions_affected_by_bomb):
-                return True
-
-    def escape_with_figure(self, bomb, figure, distance):
-        coef = 0
-
-        if figure.escaping_to is None:
-            figure.escaping_to = self.find_escape_location(bomb, figure)
-
-            if figure.escaping_to is None:
-                return True
-
-        path = self.model.tracing_helper.do_dijkstra((get_int_from_float(figure.position_x),
-                                                      0, get_int_from_float(figure.position_z)),
-                                                     figure.escaping_to)
-
-        x, z = self.model.tracing_helper.get_direction_from_path(path)
-
-        if x == 0 and z == 0:
-            if round(figure.position_x) != figure.escaping_to[0] or \
-               round(figure.position_z) != figure.escaping_to[2]:
-                x, z = figure.previous_direction
-            else:
-                return False
-
-        figure.previous_direction = x, z
-
-        if x == -1:
-            rounded_x = round(figure.position_x - distance)
-
-            if not self.model.check_if_figure_collide(rounded_x - coef, figure.position_z):
-                figure.position_x -= distance
-                figure.recalculate_vertices()
-                return True
-
-        if x == 1:
-            rounded_x = round(figure.position_x + distance)
-
-            if not self.model.check_if_figure_collide(rounded_x + coef, figure.position_z):
-                figure.position_x += distance
-                figure.recalculate_vertices()
-                return True
-
-        if z == -1:
-            rounded_z = round(figure.position_z - distance)
-
-            if not self.model.check_if_figure_collide(figure.position_x, rounded_z - coef):
-                figure.position_z -= distance
-                figure.recalculate_vertices()
-                return True
-
-        if z == 1:
-            rounded_z = round(figure.position_z + distance)
-
-            if not self.model.check_if_figure_collide(figure.position_x, rounded_z + coef):
-                figure.position_z += distance
-                figure.recalculate_vertices()
-                return True
-
-        return False
-
-    def find_escape_location(self, bomb, figure):
-        for i in range(1, HALF_OF_FIELD_SIZE * 2, 1):
-            for dx in xrange(round(figure.position_x) - i, round(figure.position_x) + i, 1):
-                for dz in xrange(round(figure.position_z) - i, round(figure.position_z) + i, 1):
-                    if dx != bomb.position_x and dz != bomb.position_z and \
-                        not any(round(dx) == position[0] and
-                                round(dz) == position[1]
-                                for position in bomb.positions_affected_by_bomb):
-                        if not self.model.check_if_figure_collide(dx, dz):
-                            return dx, 0, dz
-
-    def place_bombs(self):
-        if self.player_wants_place_bomb and not self.game_stopped:
-            new_bomb = self.model.player_figure.place_bomb()
-
-            if new_bomb is not None:  # Can be None in case of unable to place bomb
-                new_bomb.calculate_affection_of_bomb(self.model._shown)
-
-                new_bomb.timer = pyglet.clock.schedule_once(self.model.detonation, new_bomb.timespan)
-                self.model.bombs.append(new_bomb)
-
-        self.player_wants_place_bomb = False
-
-    def npc_place_bomb(self, figure):
-        if not self.game_stopped:
-            new_bomb = figure.place_bomb()
-
-            if new_bomb is not None:
-                new_bomb.calculate_affection_of_bomb(self.model._shown)
-
-                figure.previous_direction = None
-
-                new_bomb.timer = pyglet.clock.schedule_once(self.model.detonation, new_bomb.timespan)
-                self.model.bombs.append(new_bomb)
-
-
     def on_mouse_motion(self, x, y, dx, dy):
         """ Called when the player moves the mouse.
 
@@ -429,19 +263,19 @@ class Window(pyglet.window.Window):
 
         """
         if symbol == key.W:
-            self.strafe[1] = 1
+            self.simulation.strafe[1] = 1
 
         if symbol == key.S:
-            self.strafe[1] = -1
+            self.simulation.strafe[1] = -1
 
         if symbol == key.A:
-            self.strafe[0] = 1
+            self.simulation.strafe[0] = 1
 
         if symbol == key.D:
-            self.strafe[0] = -1
+            self.simulation.strafe[0] = -1
 
         elif symbol == key.SPACE:
-            self.player_wants_place_bomb = True
+            self.simulation.player_wants_place_bomb = True
 
         elif symbol == key.ESCAPE:
             self.set_exclusive_mouse(False)
@@ -464,6 +298,12 @@ class Window(pyglet.window.Window):
         elif symbol == key.F:
             self.fullscreen_request = True
 
+        elif symbol == key.P:
+            self.show_profiler = not self.show_profiler
+
+        elif symbol == key.O:
+            self.profiler.dump_csv(PROFILER_CSV_PATH)
+
     def on_key_release(self, symbol, modifiers):
         """ Called when the player releases a key. See pyglet docs for key
         mappings.
@@ -477,16 +317,16 @@ class Window(pyglet.window.Window):
 
         """
         if symbol == key.W:
-            self.strafe[1] = 0
+            self.simulation.strafe[1] = 0
 
         if symbol == key.S:
-            self.strafe[1] = 0
+            self.simulation.strafe[1] = 0
 
         if symbol == key.A:
-            self.strafe[0] = 0
+            self.simulation.strafe[0] = 0
 
         if symbol == key.D:
-            self.strafe[0] = 0
+            self.simulation.strafe[0] = 0
 
         elif symbol == key.RIGHT:
             self.rotate_horizontally = 0
@@ -506,6 +346,7 @@ class Window(pyglet.window.Window):
         """
         # label
         self.label.y = height - 10
+        self.profiler_label.y = height - 50
 
         x, y = self.width // 2, self.height // 2
         n = 10
@@ -551,23 +392,30 @@ class Window(pyglet.window.Window):
         """ Called by pyglet to draw the canvas.
 
         """
-        self.clear()
-        self.set_3d()
-        glColor3d(1, 1, 1)
-        self.model.main_batch.draw()
-        self.model.bomb_batch.draw()
-        self.set_2d()
-        self.draw_label()
-        self.status.draw()
+        with self.profiler.measure('on_draw'):
+            self.clear()
+            self.set_3d()
+            glColor3d(1, 1, 1)
+            self.renderer.draw()
+            self.set_2d()
+            self.draw_label()
+            self.status.draw()
+
+            if self.show_profiler:
+                self.profiler_label.text = self.profiler.get_summary()
+                self.profiler_label.draw()
+
+        self.profiler.end_frame()
 
     def draw_label(self):
         """ Draw the label in the top left of the screen.
 
         """
         x, y, z = self.position
-        self.label.text = '%02d (%.2f, %.2f, %.2f) (%.2f, %.2f) %d / %d' % (
+        self.label.text = '%02d (%.2f, %.2f, %.2f) (%.2f, %.2f) %d / %d %d %d' % (
             pyglet.clock.get_fps(), self.model.player_figure.position_x, 0, self.model.player_figure.position_z,
-            self.rotation[0], self.rotation[1], len(self.model._shown), len(self.model.world))
+            self.rotation[0], self.rotation[1], len(self.renderer._shown), len(self.model.world),
+            self.scheduler.overruns, self.renderer.get_queue_statistics()['backlog'])
 
         self.label.draw()
 
@@ -608,7 +456,12 @@ def opengl_setup():
 
 
 def main():
-    window = Window(width=800, height=600, caption='Bomberman', resizable=True, fullscreen=True)
+    parser = argparse.ArgumentParser(description='Play Bomberman.')
+    GameConfig.add_arguments(parser)
+    game_config = GameConfig.from_args(parser.parse_args())
+
+    window = Window(width=800, height=600, caption='Bomberman', resizable=True, fullscreen=True,
+                    game_config=game_config)
     # Hide the mouse cursor and prevent the mouse from leaving the window.
     window.set_exclusive_mouse(True)
     opengl_setup()
@@ -0,0 +1,68 @@
+import ctypes
+
+import numpy as np
+from pyglet.gl import GL_QUADS
+
+from src.basic_helpers import cubes_vertices
+
+
+class CubeInstance(object):
+    """ Handle of a single cube inside `CubeInstances`.
+
+    """
+
+    def __init__(self, instances, index):
+        self.instances = instances
+        self.index = index
+
+    def set_position(self, x, y, z):
+        self.instances.positions[self.index] = x, y, z
+        self.instances.dirty = True
+
+
+class CubeInstances(object):
+    """ Set of equally sized and textured cubes drawn from one vertex list.
+    Moving a cube only changes its row in the `positions` array, the whole
+    vertex list is written at once by `flush()` from the cached cube
+    template.
+
+    Parameters
+    ----------
+    batch : pyglet.graphics.Batch
+        Batch the vertex list is added to.
+    group : pyglet.graphics.Group
+        Group of the vertex list, usually a `TextureGroup`.
+    count : int
+        Count of cubes.
+    n : float
+        Half of the cube size.
+    texture : list
+        Texture coordinates of the cube generated by `tex_coords()`.
+
+    """
+
+    def __init__(self, batch, group, count, n, texture):
+        self.n = n
+        self.positions = np.zeros((count, 3), dtype=np.float32)
+
+        # True if any position changed since the last `flush()`.
+        self.dirty = True
+
+        self.vertex_list = batch.add(24 * count, GL_QUADS, group, ('v3f/dynamic', [0.0] * 72 * count),
+                                     ('t2f/static', list(texture) * count))
+
+    def __getitem__(self, index):
+        return CubeInstance(self, index)
+
+    def flush(self):
+        """ Write vertices of all cubes to the vertex list if any of them
+        moved, called once per frame before drawing.
+
+        """
+        if not self.dirty:
+            return
+
+        vertex_data = cubes_vertices(self.positions, self.n)
+        ctypes.memmove(self.vertex_list.vertices, vertex_data.ctypes.data, vertex_data.nbytes)
+
+        self.dirty = False
@@ -0,0 +1,67 @@
+import math
+
+import numpy as np
+
+from src.game_config import HALF_OF_FIELD_SIZE
+
+
+class DangerMap:
+    """ Grid of the ground level cells holding the earliest time at which the
+    cell is hit by a placed bomb, infinity for safe cells. Cell (x, z) of the
+    field is stored at index [x + half_size, z + half_size].
+
+    """
+
+    def __init__(self, half_size=HALF_OF_FIELD_SIZE):
+        self.half_size = half_size
+        self.detonation_times = np.full((half_size * 2 + 1, half_size * 2 + 1), math.inf)
+
+        # Mapping from (x, z) cell to list of bombs affecting it, used to
+        # restore `detonation_times` of the cell when one of them is removed.
+        self._bombs = {}
+
+    def add_bomb(self, bomb):
+        """ Mark cells affected by `bomb` as dangerous. Bomb has to have its
+        `positions_affected_by_bomb` and `detonation_time` already set.
+
+        """
+        for x, z in set(bomb.positions_affected_by_bomb):
+            self._bombs.setdefault((x, z), []).append(bomb)
+
+            index = x + self.half_size, z + self.half_size
+            self.detonation_times[index] = min(self.detonation_times[index], bomb.detonation_time)
+
+    def remove_bomb(self, bomb):
+        """ Clear danger caused by `bomb`, cells stay dangerous if they are
+        affected by another bomb.
+
+        """
+        for x, z in set(bomb.positions_affected_by_bomb):
+            bombs = self._bombs.get((x, z))
+
+            if bombs is None or bomb not in bombs:
+                continue
+
+            bombs.remove(bomb)
+
+            if not bombs:
+                del self._bombs[(x, z)]
+
+            self.detonation_times[x + self.half_size, z + self.half_size] = \
+                min((other.detonation_time for other in bombs), default=math.inf)
+
+    def is_dangerous(self, x, z):
+        """ Return True if cell at `x`, `z` is hit by any placed bomb.
+
+        """
+        return self.get_detonation_time(x, z) != math.inf
+
+    def get_detonation_time(self, x, z):
+        """ Return the earliest time at which cell at `x`, `z` is hit by a
+        bomb, infinity if no bomb affects it.
+
+        """
+        if -self.half_size <= x <= self.half_size and -self.half_size <= z <= self.half_size:
+            return self.detonation_times.item(x + self.half_size, z + self.half_size)
+
+        return math.inf
@@ -0,0 +1,456 @@
+import ctypes
+import heapq
+import itertools
+import time
+
+import numpy as np
+import pyglet
+from pyglet import *
+from pyglet.gl import *
+from pyglet.graphics import TextureGroup
+
+from src.basic_helpers import cube_vertices, cubes_vertices, cubes_tex_coords, normalize, sectorize
+from src.cube_instances import CubeInstances
+from src.particles import ParticleSystem
+from src.game_config import *
+from src.textures import *
+
+
+class FieldRenderer(object):
+    """ Draws blocks, figures and bombs of a `GameField` with pyglet. The game
+    field notifies the renderer about every block it shows or hides.
+
+    Parameters
+    ----------
+    queue_budget : float
+        Real time in seconds `process_queue()` may spend per call.
+    sector_size : int
+        Size of the sectors blocks are merged into, the `sector_size` of the
+        drawn game field.
+
+    """
+
+    def __init__(self, queue_budget=RENDER_QUEUE_BUDGET_SECS, sector_size=SECTOR_SIZE):
+        self.sector_size = sector_size
+
+        # A Batch is a collection of vertex lists for batched rendering.
+        self.main_batch = pyglet.graphics.Batch()
+        self.bomb_batch = pyglet.graphics.Batch()
+        self.particle_batch = pyglet.graphics.Batch()
+
+        # A TextureGroup manages an OpenGL texture.
+        self.group = TextureGroup(image.load(TEXTURE_PATH).get_texture())
+
+        # Mapping from position to the texture of all drawn blocks.
+        self._shown = {}
+
+        # Mapping from sector to a set of positions of drawn blocks inside that sector.
+        self._sector_blocks = {}
+
+        # Mapping from sector to a pyglet `VertexList` merging all drawn blocks of that sector.
+        self._sector_lists = {}
+
+        # Sectors whose vertex list is outdated, rebuilt before the next draw.
+        self._dirty_sectors = set()
+
+        # Sectors near the spectator, only they have a vertex list. None if
+        # all sectors are drawn, see `change_sectors()`.
+        self.visible_sectors = None
+
+        # Figures passed to `show_figures()`, their vertices are updated before each draw.
+        self.figures = []
+
+        # `CubeInstances` drawing figures and their bombs, created by `show_figures()`.
+        self.figure_instances = None
+        self.bomb_instances = None
+
+        # Sparks of blasts, moved by `update_particles()`.
+        self.particles = ParticleSystem()
+        self.blast_emitter = self.particles.add_emitter(BLAST_PARTICLE_BUDGET)
+
+        # Vertex list of points drawing `particles`, one point per particle of the pool.
+        self._particle_list = None
+
+        # Count of particles written to `_particle_list` by the last upload.
+        self._uploaded_particles = 0
+
+        # Mapping from position to the texture a queued change shows, None if
+        # it hides the block. Later changes of a position replace earlier ones.
+        self._pending = {}
+
+        # Heap of (squared distance to the camera, sequence number, position)
+        # of positions in `_pending`, nearest blocks are processed first.
+        self._queue = []
+
+        # Source of sequence numbers keeping the heap order stable.
+        self._sequence = itertools.count()
+
+        self.queue_budget = queue_budget
+
+        # Position of the camera, `_queue` is ordered by distance to it.
+        self.camera_position = (0, 0, 0)
+
+        # Camera position `_queue` was ordered by, differs after the camera moved.
+        self._queue_camera_position = self.camera_position
+
+        # Statistics of the queue, see `get_queue_statistics()`.
+        self.queued_count = 0
+        self.coalesced_count = 0
+        self.processed_count = 0
+        self.max_backlog = 0
+        self.last_processing_time = 0.0
+
+    def show_figures(self, figures):
+        self.figures = list(figures)
+        bombs = [bomb for figure in figures for bomb in figure.bombs]
+
+        self.figure_instances = CubeInstances(self.main_batch, self.group, len(figures), 0.25, BRICK)
+        self.bomb_instances = CubeInstances(self.main_batch, self.group, len(bombs), 0.25, SAND)
+
+        for index, figure in enumerate(figures):
+            figure.gl_object = self.figure_instances[index]
+
+        for index, bomb in enumerate(bombs):
+            bomb.gl_object = self.bomb_instances[index]
+            bomb.recalculate_vertices()
+
+        for figure in figures:
+            figure.mark_dirty()
+
+    def show_block(self, position, texture, immediate=True):
+        """ Draw the block at the given `position`.
+
+        Parameters
+        ----------
+        position : tuple of len 3
+            The (x, y, z) position of the block to show.
+        texture : list of len 3
+            The coordinates of the texture squares. Use `tex_coords()` to
+            generate.
+        immediate : bool
+            Whether or not to show the block immediately.
+
+        """
+        if immediate:
+            if position in self._pending:
+                self._pending[position] = texture
+
+            self._show_block(position, texture)
+        else:
+            self._enqueue(position, texture)
+
+    def _show_block(self, position, texture):
+        """ Private implementation of the `show_block()` method.
+
+        Parameters
+        ----------
+        position : tuple of len 3
+            The (x, y, z) position of the block to show.
+        texture : list of len 3
+            The coordinates of the texture squares. Use `tex_coords()` to
+            generate.
+
+        """
+        self._shown[position] = texture
+        self._sector_blocks.setdefault(sectorize(position, self.sector_size), set()).add(position)
+        self._mark_dirty(position)
+
+    def hide_block(self, position, immediate=True):
+        """ Remove the block at the given `position` from the canvas.
+
+        Parameters
+        ----------
+        position : tuple of len 3
+            The (x, y, z) position of the block to hide.
+        immediate : bool
+            Whether or not to immediately remove the block from the canvas.
+
+        """
+        if immediate:
+            if position in self._pending:
+                self._pending[position] = None
+
+            if position in self._shown:
+                self._hide_block(position)
+        else:
+            self._enqueue(position, None)
+
+    def _hide_block(self, position):
+        """ Private implementation of the 'hide_block()` method.
+
+        """
+        del self._shown[position]
+        self._sector_blocks[sectorize(position, self.sector_size)].discard(position)
+        self._mark_dirty(position)
+
+    def _mark_dirty(self, position):
+        """ Mark sectors of the block at `position` and of its neighbours as
+        outdated, neighbouring faces become visible or hidden.
+
+        """
+        x, y, z = position
+        size = self.sector_size
+
+        # Block positions are whole numbers, so this equals `sectorize()`
+        # without its rounding, all blocks of the field pass through here.
+        self._dirty_sectors.add((x // size, 0, z // size))
+
+        for dx, dy, dz in FACES:
+            self._dirty_sectors.add(((x + dx) // size, 0, (z + dz) // size))
+
+    def _build_sector(self, sector):
+        """ Replace vertex list of `sector` by a new one containing all blocks
+        currently drawn in that sector. Faces touching another drawn block are
+        left out.
+
+        """
+        old_list = self._sector_lists.pop(sector, None)
+
+        if old_list is not None:
+            old_list.delete()
+
+        if self.visible_sectors is not None and sector not in self.visible_sectors:
+            return
+
+        positions = self._sector_blocks.get(sector)
+
+        if not positions:
+            return
+
+        positions = list(positions)
+        faces = np.array([[(x + dx, y + dy, z + dz) not in self._shown for dx, dy, dz in FACES]
+                          for x, y, z in positions], dtype=bool)
+
+        if not faces.any():
+            return
+
+        vertex_data = cubes_vertices(positions, 0.5, faces)
+        texture_data = cubes_tex_coords([self._shown[position] for position in positions], faces)
+
+        # Static attributes would be interleaved into one buffer, dynamic ones
+        # get a buffer each, so the arrays can be copied into them directly.
+        vertex_list = self.main_batch.add(len(vertex_data), GL_QUADS, self.group, 'v3f/dynamic', 't2f/dynamic')
+        ctypes.memmove(vertex_list.vertices, vertex_data.ctypes.data, vertex_data.nbytes)
+        ctypes.memmove(vertex_list.tex_coords, texture_data.ctypes.data, texture_data.nbytes)
+
+        self._sector_lists[sector] = vertex_list
+
+    def build_dirty_sectors(self):
+        """ Rebuild vertex lists of all sectors changed since the last call.
+
+        """
+        for sector in self._dirty_sectors:
+            self._build_sector(sector)
+
+        self._dirty_sectors.clear()
+
+    def change_sectors(self, sector):
+        """ Draw only sectors near `sector`, the sector the spectator is in.
+        Vertex lists of sectors left behind are deleted, sectors coming into
+        view are built before the next draw. Blocks of the game field are
+        tracked regardless of the sector.
+
+        """
+        x, y, z = sector
+        pad = 4
+
+        visible = {(x + dx, y, z + dz)
+                   for dx in range(-pad, pad + 1) for dz in range(-pad, pad + 1)
+                   if dx ** 2 + dz ** 2 <= (pad + 1) ** 2}
+
+        for hidden in set(self._sector_lists) - visible:
+            self._sector_lists.pop(hidden).delete()
+
+        self._dirty_sectors.update(visible - (self.visible_sectors or set()))
+        self.visible_sectors = visible
+
+    def draw_bomb(self, bomb):
+        x, y, z = bomb.position_x, 1, bomb.position_z
+        vertex_data = cube_vertices(x, y, z, 0.5)
+        texture_data = list(STONE)
+
+        return pyglet.graphics.draw(24, GL_QUADS, ('v3f/static', vertex_data), ('t2f/static', texture_data))
+
+    def flush_figures(self):
+        """ Recalculate vertices of figures which moved since the last frame.
+
+        """
+        for figure in self.figures:
+            if figure.dirty:
+                figure.recalculate_vertices()
+
+    def show_blast(self, cells):
+        """ Spawn sparks in every (x, z) cell hit by a blast.
+
+        """
+        # The cell of the bomb is part of every blast ray.
+        self.particles.emit([(x, 0, z) for x, z in dict.fromkeys(cells)], SPARKS_PER_BLAST_CELL,
+                            emitter=self.blast_emitter)
+
+    def update_particles(self, dt):
+        self.particles.update(dt)
+
+    def _upload_particles(self):
+        """ Write positions and colors of all particles to the particle
+        vertex list, points of free rows of the pool are transparent.
+
+        """
+        if self._particle_list is None:
+            self._particle_list = self.particle_batch.add(self.particles.capacity, GL_POINTS, None,
+                                                          ('v3f/stream', [0.0] * 3 * self.particles.capacity),
+                                                          ('c4f/stream', [0.0] * 4 * self.particles.capacity))
+
+        count = len(self.particles)
+        vertex_data = self.particles.positions[:count]
+        color_data = self.particles.get_colors()
+        row_size = self.particles.colors.strides[0]
+
+        colors = self._particle_list.colors
+
+        ctypes.memmove(self._particle_list.vertices, vertex_data.ctypes.data, vertex_data.nbytes)
+        ctypes.memmove(colors, color_data.ctypes.data, color_data.nbytes)
+
+        # Rows freed since the last upload become transparent, later rows already are.
+        if self._uploaded_particles > count:
+            ctypes.memset(ctypes.addressof(colors) + count * row_size, 0,
+                          (self._uploaded_particles - count) * row_size)
+
+        self._uploaded_particles = count
+
+    def draw_particles(self):
+        if not self._uploaded_particles and not len(self.particles):
+            return
+
+        self._upload_particles()
+
+        glPointSize(PARTICLE_POINT_SIZE)
+        glEnable(GL_BLEND)
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE)
+        glDepthMask(GL_FALSE)
+
+        self.particle_batch.draw()
+
+        glDepthMask(GL_TRUE)
+        glDisable(GL_BLEND)
+
+    def draw(self):
+        self.build_dirty_sectors()
+        self.flush_figures()
+
+        for instances in (self.figure_instances, self.bomb_instances):
+            if instances is not None:
+                instances.flush()
+
+        self.main_batch.draw()
+        self.bomb_batch.draw()
+        self.draw_particles()
+
+    def set_camera_position(self, position):
+        """ Set `position` of the camera, queued blocks nearest to it are
+        shown or hidden first. The position is rounded to whole blocks so the
+        queue is not reordered on every small camera movement.
+
+        """
+        self.camera_position = normalize(position)
+
+    def _get_priority(self, position):
+        x, y, z = position
+        camera_x, camera_y, camera_z = self.camera_position
+
+        return (x - camera_x) ** 2 + (y - camera_y) ** 2 + (z - camera_z) ** 2
+
+    def _enqueue(self, position, texture):
+        """ Queue showing the block at `position` with `texture`, or hiding it
+        if `texture` is None. A change already queued for the same position
+        is replaced.
+
+        """
+        self.queued_count += 1
+
+        if not self._queue:
+            self._queue_camera_position = self.camera_position
+
+        if position in self._pending:
+            self.coalesced_count += 1
+        else:
+            heapq.heappush(self._queue, (self._get_priority(position), next(self._sequence), position))
+
+        self._pending[position] = texture
+        self.max_backlog = max(self.max_backlog, len(self._pending))
+
+    def _dequeue(self):
+        """ Pop the queued change nearest to the camera and apply it. Changes
+        which would leave the block as it already is are dropped.
+
+        """
+        _, _, position = heapq.heappop(self._queue)
+        texture = self._pending.pop(position)
+
+        if texture is None:
+            if position in self._shown:
+                self._hide_block(position)
+        elif self._shown.get(position) != texture:
+            self._show_block(position, texture)
+
+        self.processed_count += 1
+
+    def _reorder_queue(self):
+        """ Recompute priorities of all queued changes if the camera moved
+        since they were computed.
+
+        """
+        if self._queue_camera_position == self.camera_position:
+            return
+
+        self._queue = [(self._get_priority(position), sequence, position) for _, sequence, position in self._queue]
+        heapq.heapify(self._queue)
+
+        self._queue_camera_position = self.camera_position
+
+    def process_queue(self, budget=None):
+        """ Apply queued changes, nearest to the camera first, until `budget`
+        seconds of real time pass. This allows the game loop to run smoothly.
+        The queue is populated by `show_block()` and `hide_block()` called
+        with immediate=False.
+
+        Parameters
+        ----------
+        budget : float
+            Real time in seconds this call may take, `queue_budget` if None.
+
+        """
+        if budget is None:
+            budget = self.queue_budget
+
+        start = time.perf_counter()
+        self._reorder_queue()
+
+        while self._queue and time.perf_counter() - start < budget:
+            self._dequeue()
+
+        self.last_processing_time = time.perf_counter() - start
+
+    def process_entire_queue(self):
+        """ Process the entire queue with no breaks.
+
+        """
+        self._reorder_queue()
+
+        while self._queue:
+            self._dequeue()
+
+    def get_queue_statistics(self):
+        """ Return dictionary with current and maximal count of queued
+        changes, counts of changes queued, coalesced with an earlier change
+        of the same position and processed, and real time spent by the last
+        `process_queue()` call.
+
+        """
+        return {
+            'backlog': len(self._pending),
+            'max_backlog': self.max_backlog,
+            'queued': self.queued_count,
+            'coalesced': self.coalesced_count,
+            'processed': self.processed_count,
+            'last_processing_time': self.last_processing_time,
+        }
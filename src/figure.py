@@ -1,10 +1,11 @@
-from src.basic_helpers import cube_vertices, get_int_from_float
-from src.game_config import BOMB_STARTING_RANGE, BOMB_TIMESPAN_SECS, INITIAL_BOMBS_COUNT
+from src.basic_helpers import get_int_from_float
+from src.game_config import GameConfig
 from src.bomb import Bomb
 
 
 class BaseFigure:
-    def __init__(self, position_x, position_z):
+    def __init__(self, position_x, position_z, config=None):
+        self.config = config if config is not None else GameConfig()
         self.position_x = position_x
         self.position_z = position_z
         self.gl_object = None
@@ -14,11 +15,22 @@ class BaseFigure:
         self.hit = False
         self.previous_direction = None
 
+        # True if the figure moved since its vertices were calculated.
+        self.dirty = True
+
+    def mark_dirty(self):
+        """ Mark vertices of the figure as outdated, the renderer recalculates
+        them once before drawing the next frame.
+
+        """
+        self.dirty = True
+
     def recalculate_vertices(self):
         if self.gl_object is not None:
-            self.gl_object.vertices = cube_vertices(self.position_x, 0, self.position_z, 0.25)
+            self.gl_object.set_position(self.position_x, 0, self.position_z)
 
         self.reposition_not_active_bombs()
+        self.dirty = False
 
     def place_bomb(self):
         for bomb in self.bombs:
@@ -26,8 +38,8 @@ class BaseFigure:
                 bomb.active = True
                 self.placed_bombs += 1
 
-                bomb.position_z = get_int_from_float(bomb.position_z)
-                bomb.position_x = get_int_from_float(bomb.position_x)
+                bomb.position_z = get_int_from_float(self.position_z)
+                bomb.position_x = get_int_from_float(self.position_x)
 
                 return bomb
 
@@ -39,8 +51,9 @@ class BaseFigure:
     def generate_bombs(self):
         result = []
 
-        for i in range(0, INITIAL_BOMBS_COUNT, 1):
-            result.append(Bomb(self, self.position_x, self.position_z, BOMB_STARTING_RANGE, BOMB_TIMESPAN_SECS))
+        for i in range(0, self.config.initial_bombs_count, 1):
+            result.append(Bomb(self, self.position_x, self.position_z, self.config.bomb_starting_range,
+                               self.config.bomb_timespan_secs))
 
         return result
 
@@ -63,7 +76,4 @@ class BaseFigure:
     def reposition_not_active_bombs(self):
         for bomb in self.bombs:
             if not bomb.active and bomb.gl_object is not None:
-                bomb.position_x = self.position_x
-                bomb.position_z = self.position_z
-
-                bomb.recalculate_vertices()
+                bomb.gl_object.set_position(self.position_x, 0, self.position_z)
@@ -0,0 +1,67 @@
+class FigureIndex:
+    """ Spatial hash from ground level cell (x, z) to figures standing in it.
+    A figure stands in the cell its rounded position falls into, the index
+    has to be told about every move by `update()`.
+
+    """
+
+    def __init__(self, figures=()):
+        # Mapping from (x, z) cell to list of figures standing in it.
+        self._cells = {}
+
+        # Mapping from figure to the cell it is stored under.
+        self._figure_cells = {}
+
+        for figure in figures:
+            self.add(figure)
+
+    def __len__(self):
+        return len(self._figure_cells)
+
+    def __contains__(self, figure):
+        return figure in self._figure_cells
+
+    @staticmethod
+    def get_cell(figure):
+        return round(figure.position_x), round(figure.position_z)
+
+    def add(self, figure):
+        cell = self.get_cell(figure)
+
+        self._figure_cells[figure] = cell
+        self._cells.setdefault(cell, []).append(figure)
+
+    def remove(self, figure):
+        cell = self._figure_cells.pop(figure)
+        figures = self._cells[cell]
+
+        figures.remove(figure)
+
+        if not figures:
+            del self._cells[cell]
+
+    def update(self, figure):
+        """ Move `figure` to the cell of its current position. Figures not in
+        the index are ignored.
+
+        Returns
+        -------
+        moved : bool
+            True if the figure crossed a cell boundary.
+
+        """
+        cell = self._figure_cells.get(figure)
+
+        if cell is None or cell == self.get_cell(figure):
+            return False
+
+        self.remove(figure)
+        self.add(figure)
+
+        return True
+
+    def get(self, x, z):
+        """ Return list of figures standing in cell at `x`, `z`.
+
+        """
+        return list(self._cells.get((x, z), ()))
@@ -1,5 +1,16 @@
+import json
+
 TICKS_PER_SEC = 60
 
+# Count of fixed simulation steps per tick.
+SUBSTEPS_PER_TICK = 8
+
+# Maximal game time simulated in one tick, the rest is dropped.
+MAX_CATCH_UP_SECS = 0.2
+
+# Real time in seconds the renderer may spend on queued block changes per frame.
+RENDER_QUEUE_BUDGET_SECS = 1.0 / TICKS_PER_SEC
+
 # Size of sectors used to ease block loading.
 SECTOR_SIZE = 16
 
@@ -37,4 +48,130 @@ BOMB_TIMESPAN_SECS = 3
 
 TRACING_GRASS_CONSTANT = 5
 
+# Maximal count of live particles.
+PARTICLE_CAPACITY = 16384
+
+# Maximal count of live sparks of all blasts together.
+BLAST_PARTICLE_BUDGET = 12288
+
+# Count of sparks spawned in every cell hit by a blast.
+SPARKS_PER_BLAST_CELL = 200
+
+# Maximal initial speed of a spark and its lifetime in seconds.
+SPARK_SPEED = 4.0
+SPARK_LIFETIME_SECS = 0.8
+
+# Vertical acceleration of particles.
+PARTICLE_GRAVITY = -9.81
+
+# Particles falling under this height are removed, top of the floor blocks.
+PARTICLE_GROUND_LEVEL = -0.5
+
+# Size of a drawn particle in pixels.
+PARTICLE_POINT_SIZE = 3
+
+# Maximal count of paths remembered by TracingHelper.
+PATH_CACHE_SIZE = 256
+
 INITIAL_BOMBS_COUNT = 1
+
+# Game time after which a headless match ends undecided.
+MATCH_MAX_SECS = 120
+
+# Count of last frames the profiler computes percentiles from.
+PROFILER_WINDOW_FRAMES = 300
+
+# Count of last frames the profiler keeps for CSV export.
+PROFILER_HISTORY_FRAMES = 36000
+
+PROFILER_CSV_PATH = 'profile.csv'
+
+
+class GameConfig(object):
+    """ Runtime configuration of a match. Every option defaults to the module
+    constant of the same name in upper case, so a config created without
+    arguments plays the same game as before.
+
+    Parameters
+    ----------
+    **options
+        Values overriding the defaults, see `OPTIONS` for accepted names.
+
+    """
+
+    OPTIONS = ('half_of_field_size', 'sector_size', 'ticks_per_sec', 'substeps_per_tick', 'max_catch_up_secs',
+               'walking_speed', 'bomb_starting_range', 'bomb_timespan_secs', 'initial_bombs_count',
+               'tracing_grass_constant', 'path_cache_size', 'match_max_secs')
+
+    def __init__(self, **options):
+        for name in self.OPTIONS:
+            setattr(self, name, globals()[name.upper()])
+
+        for name, value in options.items():
+            if name not in self.OPTIONS:
+                raise ValueError('Unknown config option %s' % name)
+
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return 'GameConfig(%s)' % ', '.join('%s=%r' % item for item in self.to_dict().items())
+
+    def __eq__(self, other):
+        return isinstance(other, GameConfig) and self.to_dict() == other.to_dict()
+
+    @property
+    def steps_per_sec(self):
+        """ Count of fixed simulation steps per second of game time.
+
+        """
+        return self.ticks_per_sec * self.substeps_per_tick
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.OPTIONS}
+
+    def replace(self, **options):
+        """ Return copy of the config with given options overridden.
+
+        """
+        values = self.to_dict()
+        values.update(options)
+
+        return GameConfig(**values)
+
+    @classmethod
+    def from_file(cls, path):
+        """ Load config from JSON file at `path` holding an object with
+        option names as keys. Missing options keep their defaults.
+
+        """
+        with open(path) as config_file:
+            return cls(**json.load(config_file))
+
+    @staticmethod
+    def add_arguments(parser):
+        """ Add `--config` and `--set` options to `argparse` `parser`, read
+        them back by `from_args()`.
+
+        """
+        parser.add_argument('--config', help='JSON file with game config options')
+        parser.add_argument('--set', action='append', default=[], metavar='OPTION=VALUE',
+                            help='override a game config option, e.g. half_of_field_size=25')
+
+    @classmethod
+    def from_args(cls, args):
+        """ Create config from arguments parsed by a parser prepared by
+        `add_arguments()`. Options given by `--set` win over the file.
+
+        """
+        config = cls.from_file(args.config) if args.config else cls()
+        options = {}
+
+        for assignment in args.set:
+            name, separator, value = assignment.partition('=')
+
+            if not separator or name not in cls.OPTIONS:
+                raise ValueError('Invalid config override %s' % assignment)
+
+            options[name] = json.loads(value)
+
+        return config.replace(**options)
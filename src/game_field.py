@@ -1,9 +1,3 @@
-import time
-
-from pyglet import *
-from pyglet.gl import *
-from pyglet.graphics import TextureGroup
-
 from src.basic_helpers import *
 from src.game_config import *
 from src.npc_figure import NPCFigure
@@ -11,19 +5,27 @@ from src.player_figure import PlayerFigure
 from src.textures import *
 from collections import deque
 
+from src.danger_map import DangerMap
+from src.figure_index import FigureIndex
+from src.profiler import Profiler
+from src.occupancy_grid import OccupancyGrid, GRASS_CELL, STONE_CELL
 from src.tracing_helper import TracingHelper
 
+BLAST_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
 
 class GameField(object):
 
-    def __init__(self):
+    def __init__(self, renderer=None, profiler=None, config=None):
 
-        # A Batch is a collection of vertex lists for batched rendering.
-        self.main_batch = pyglet.graphics.Batch()
-        self.bomb_batch = pyglet.graphics.Batch()
+        # `GameConfig` of the match, defaults to the module constants.
+        self.config = config if config is not None else GameConfig()
 
-        # A TextureGroup manages an OpenGL texture.
-        self.group = TextureGroup(image.load(TEXTURE_PATH).get_texture())
+        # Optional `FieldRenderer` drawing the field, None when running headless.
+        self.renderer = renderer
+
+        # `Profiler` measuring time spent in the game logic, disabled by default.
+        self.profiler = profiler if profiler is not None else Profiler(enabled=False)
 
         # A mapping from position to the texture of the block at that position.
         # This defines all the blocks that are currently in the world.
@@ -32,29 +34,31 @@ class GameField(object):
         # Same mapping as `world` but only contains blocks that are shown.
         self.shown = {}
 
-        # Mapping from position to a pyglet `VertextList` for all shown blocks.
-        self._shown = {}
+        # Occupancy of the ground level by shown blocks, kept in sync with `shown`.
+        self.grid = OccupancyGrid(self.config.half_of_field_size, self.config.tracing_grass_constant)
 
-        # Mapping from sector to a list of positions inside that sector.
-        self.sectors = {}
+        self.bombs = deque([])
 
-        # Simple function queue implementation. The queue is populated with
-        # _show_block() and _hide_block() calls
-        self.queue = deque()
+        # Earliest detonation time of bombs affecting each ground level cell.
+        self.danger_map = DangerMap(self.config.half_of_field_size)
 
-        self.bombs = deque([])
+        # Game time in seconds, advanced by the game loop.
+        self.elapsed_time = 0.0
 
-        self.tracing_helper = TracingHelper(self)
+        self.tracing_helper = TracingHelper(self, self.config)
 
         self.player_figure, self.npc_figures = self._initialize_figures()
 
+        # NPC figures by the cell they stand in, kept up to date by `move_figure()`.
+        self.npc_index = FigureIndex(self.npc_figures)
+
         self._initialize()
 
     def _initialize_figures(self):
-        starting_positions = get_starting_positions(HALF_OF_FIELD_SIZE * 2)
+        starting_positions = get_starting_positions(self.config.half_of_field_size * 2)
 
-        player_figure = PlayerFigure(starting_positions[0][0], starting_positions[0][1])
-        npc_figure_one = NPCFigure(starting_positions[1][0], starting_positions[1][1])
+        player_figure = PlayerFigure(starting_positions[0][0], starting_positions[0][1], self.config)
+        npc_figure_one = NPCFigure(starting_positions[1][0], starting_positions[1][1], self.config)
 
         return player_figure, [npc_figure_one]
 
@@ -62,7 +66,7 @@ class GameField(object):
         """ Initialize the world by placing all the blocks.
 
         """
-        n = HALF_OF_FIELD_SIZE
+        n = self.config.half_of_field_size
         s = 1  # step size
         y = 0  # initial y height
 
@@ -82,7 +86,14 @@ class GameField(object):
                     for dy in xrange(0, 1):
                         self.add_block((x, y + dy, z), STONE, immediate=False)
 
-        self.show_figures(([self.player_figure] + self.npc_figures))
+        # Every exposed block is shown, the game logic depends on them. Which
+        # of them are drawn near the spectator is up to the renderer.
+        for position in self.world:
+            if self.exposed(position):
+                self.show_block(position, False)
+
+        if self.renderer is not None:
+            self.renderer.show_figures(([self.player_figure] + self.npc_figures))
 
     def exposed(self, position):
         """ Returns False is given `position` is surrounded on all 6 sides by
@@ -98,20 +109,6 @@ class GameField(object):
 
         return False
 
-    def show_figures(self, figures):
-        for figure in figures:
-            x, z = figure.position_x, figure.position_z
-            vertex_data = cube_vertices(x, 0, z, 0.25)
-            texture_data = list(BRICK)
-
-            # create vertex list
-            figure.gl_object = self.main_batch.add(24, GL_QUADS, self.group, ('v3f/dynamic', vertex_data), ('t2f/static', texture_data))
-
-            for bomb in figure.bombs:
-                vertex_data = cube_vertices(x, 0, z, 0.1)
-                texture_data = list(SAND)
-                bomb.gl_object = self.main_batch.add(24, GL_QUADS, self.group, ('v3f/dynamic', vertex_data), ('t2f/static', texture_data))
-
     def add_block(self, position, texture, immediate=True):
         """ Add a block with the given `texture` and `position` to the world.
 
@@ -130,7 +127,6 @@ class GameField(object):
             self.remove_block(position, immediate)
 
         self.world[position] = texture
-        self.sectors.setdefault(sectorize(position), []).append(position)
 
         if immediate:
             if self.exposed(position):
@@ -150,7 +146,6 @@ class GameField(object):
 
         """
         del self.world[position]
-        self.sectors[sectorize(position)].remove(position)
 
         if immediate:
             if position in self.shown:
@@ -194,31 +189,10 @@ class GameField(object):
         """
         texture = self.world[position]
         self.shown[position] = texture
+        self._update_ground(position, texture)
 
-        if immediate:
-            self._show_block(position, texture)
-        else:
-            self._enqueue(self._show_block, position, texture)
-
-    def _show_block(self, position, texture):
-        """ Private implementation of the `show_block()` method.
-
-        Parameters
-        ----------
-        position : tuple of len 3
-            The (x, y, z) position of the block to show.
-        texture : list of len 3
-            The coordinates of the texture squares. Use `tex_coords()` to
-            generate.
-
-        """
-        x, y, z = position
-        vertex_data = cube_vertices(x, y, z, 0.5)
-        texture_data = list(texture)
-
-        # create vertex list
-        self._shown[position] = self.main_batch.add(24, GL_QUADS, self.group, ('v3f/static', vertex_data),
-                                                    ('t2f/static', texture_data))
+        if self.renderer is not None:
+            self.renderer.show_block(position, texture, immediate)
 
     def hide_block(self, position, immediate=True):
         """ Hide the block at the given `position`. Hiding does not remove the
@@ -233,26 +207,35 @@ class GameField(object):
 
         """
         self.shown.pop(position)
+        self._update_ground(position, None)
 
-        if immediate:
-            self._hide_block(position)
-        else:
-            self._enqueue(self._hide_block, position)
+        if self.renderer is not None:
+            self.renderer.hide_block(position, immediate)
 
-    def _hide_block(self, position):
-        """ Private implementation of the 'hide_block()` method.
+    def _update_ground(self, position, texture):
+        """ Propagate change of shown block at `position` to the occupancy
+        grid and tracing helper, blocks outside of ground level are ignored.
 
         """
-        self._shown.pop(position).delete()
+        x, y, z = position
+
+        if y == 0:
+            self.grid.set_block(x, z, texture)
+            self.tracing_helper.update_cells((position,))
 
     def check_if_hit_npcs(self, x, z):
-        hit_npcs = []
+        return self.npc_index.get(x, z)
 
-        for npc in self.npc_figures:
-            if round(npc.position_x) == x and round(npc.position_z) == z:
-                hit_npcs.append(npc)
+    def move_figure(self, figure, position_x, position_z):
+        """ Move `figure` to the given position. All figure movement has to go
+        through this method to keep `npc_index` up to date.
 
-        return hit_npcs
+        """
+        figure.position_x = position_x
+        figure.position_z = position_z
+
+        self.npc_index.update(figure)
+        figure.mark_dirty()
 
     def check_if_hit_player(self, x, z):
         return get_int_from_float(self.player_figure.position_x) == x \
@@ -266,166 +249,47 @@ class GameField(object):
         # figure.gl_object.delete()
         figure.hit = True
 
-    def detonation(self, dt):
-        if len(self.bombs) > 0:
-            bomb = self.bombs.popleft()
-            _range = bomb.range
-
-            for dx in range(bomb.position_x, (bomb.position_x - _range), -1):
-                block = self.shown.get((dx, 0, bomb.position_z))
-                if block is not None:
-                    if block == GRASS:
-                        self.hide_block((dx, 0, bomb.position_z))
-                    elif block == STONE:
-                        break
-
-                hit_npcs = self.check_if_hit_npcs(dx, bomb.position_z)
-                self.remove_figures(hit_npcs)
-
-                if self.check_if_hit_player(dx, bomb.position_z):
-                    self.player_figure.hit = True
-
-            for dx in range(bomb.position_x, (bomb.position_x + _range), 1):
-                block = self.shown.get((dx, 0, bomb.position_z))
-                if block is not None:
-                    if block == GRASS:
-                        self.hide_block((dx, 0, bomb.position_z))
-                    elif block == STONE:
-                        break
-
-                hit_npcs = self.check_if_hit_npcs(dx, bomb.position_z)
-                self.remove_figures(hit_npcs)
-
-                if self.check_if_hit_player(dx, bomb.position_z):
-                    self.player_figure.hit = True
-
-            for dz in range(bomb.position_z, bomb.position_z - _range, -1):
-                block = self.shown.get((bomb.position_x, 0, dz))
-                if block is not None:
-                    if block == GRASS:
-                        self.hide_block((bomb.position_x, 0, dz))
-                    elif block == STONE:
-                        break
-
-                hit_npcs = self.check_if_hit_npcs(bomb.position_x, dz)
-                self.remove_figures(hit_npcs)
-
-                if self.check_if_hit_player(bomb.position_x, dz):
-                    self.player_figure.hit = True
-
-            for dz in range(bomb.position_z, bomb.position_z + _range, 1):
-                block = self.shown.get((bomb.position_x, 0, dz))
-                if block is not None:
-                    if block == GRASS:
-                        self.hide_block((bomb.position_x, 0, dz))
-                    elif block == STONE:
-                        break
-
-                hit_npcs = self.check_if_hit_npcs(bomb.position_x, dz)
-                self.remove_figures(hit_npcs)
-
-                if self.check_if_hit_player(bomb.position_x, dz):
-                    self.player_figure.hit = True
-
-            bomb.figure.placed_bombs -= 1
-            bomb.figure.escaping_to = None
-            bomb.active = False
-
-            bomb.figure.reposition_not_active_bombs()
-
-            self.tracing_helper = TracingHelper(self)
-
-    def draw_bomb(self, bomb):
-        x, y, z = bomb.position_x, 1, bomb.position_z
-        vertex_data = cube_vertices(x, y, z, 0.5)
-        texture_data = list(STONE)
-
-        return pyglet.graphics.draw(24, GL_QUADS, ('v3f/static', vertex_data), ('t2f/static', texture_data))
-
-    def show_sector(self, sector):
-        """ Ensure all blocks in the given sector that should be shown are
-        drawn to the canvas.
+    def add_bomb(self, bomb):
+        """ Register freshly placed `bomb`, it detonates after its timespan
+        passes. Scheduling of `detonation()` is left to the caller.
 
         """
-        for position in self.sectors.get(sector, []):
-
-            if position not in self.shown and self.exposed(position):
-                self.show_block(position, False)
+        bomb.calculate_affection_of_bomb(self.grid)
+        bomb.detonation_time = self.elapsed_time + bomb.timespan
 
-    def hide_sector(self, sector):
-        """ Ensure all blocks in the given sector that should be hidden are
-        removed from the canvas.
+        self.bombs.append(bomb)
+        self.danger_map.add_bomb(bomb)
 
-        """
-        for position in self.sectors.get(sector, []):
-
-            if position in self.shown:
-                self.hide_block(position, False)
-
-    def change_sectors(self, before, after):
-        """ Move from sector `before` to sector `after`. A sector is a
-        contiguous x, y sub-region of world. Sectors are used to speed up
-        world rendering.
-
-        """
-        before_set = set()
-        after_set = set()
-        pad = 4
-
-        for dx in xrange(-pad, pad + 1):
-
-            for dy in [0]:
-
-                for dz in xrange(-pad, pad + 1):
+    def detonation(self, dt):
+        with self.profiler.measure('detonation'):
+            if len(self.bombs) > 0:
+                bomb = self.bombs.popleft()
+                self.danger_map.remove_bomb(bomb)
 
-                    if dx ** 2 + dy ** 2 + dz ** 2 > (pad + 1) ** 2:
-                        continue
-                    if before:
-                        x, y, z = before
-                        before_set.add((x + dx, y + dy, z + dz))
-                    if after:
-                        x, y, z = after
-                        after_set.add((x + dx, y + dy, z + dz))
+                blast_cells = []
 
-        show = after_set - before_set
-        hide = before_set - after_set
+                for dx, dz in BLAST_DIRECTIONS:
+                    for x, z in self.grid.blast_ray(bomb.position_x, bomb.position_z, dx, dz, bomb.range, STONE_CELL):
+                        blast_cells.append((x, z))
 
-        for sector in show:
-            self.show_sector(sector)
-        for sector in hide:
-            self.hide_sector(sector)
+                        if self.grid.get(x, z) == GRASS_CELL:
+                            self.hide_block((x, 0, z))
 
-    def _enqueue(self, func, *args):
-        """ Add `func` to the internal queue.
+                        hit_npcs = self.check_if_hit_npcs(x, z)
+                        self.remove_figures(hit_npcs)
 
-        """
-        self.queue.append((func, args))
+                        if self.check_if_hit_player(x, z):
+                            self.player_figure.hit = True
 
-    def _dequeue(self):
-        """ Pop the top function from the internal queue and call it.
+                bomb.figure.placed_bombs -= 1
+                bomb.figure.escaping_to = None
+                bomb.figure.escape_path = None
+                bomb.active = False
 
-        """
-        func, args = self.queue.popleft()
-        func(*args)
+                bomb.figure.mark_dirty()
 
-    def process_queue(self):
-        """ Process the entire queue while taking periodic breaks. This allows
-        the game loop to run smoothly. The queue contains calls to
-        _show_block() and _hide_block() so this method should be called if
-        add_block() or remove_block() was called with immediate=False
-
-        """
-        start = time.clock()
-
-        while self.queue and time.clock() - start < 1.0 / TICKS_PER_SEC:
-            self._dequeue()
-
-    def process_entire_queue(self):
-        """ Process the entire queue with no breaks.
-
-        """
-        while self.queue:
-            self._dequeue()
+                if self.renderer is not None:
+                    self.renderer.show_blast(blast_cells)
 
     def check_if_figure_collide(self, position_x, position_z):
         figure_size_half = 0.25
@@ -439,16 +303,11 @@ class GameField(object):
         y = 0
         z = get_int_from_float(position_z)
 
-        borders = HALF_OF_FIELD_SIZE - 1
+        borders = self.config.half_of_field_size - 1
 
         if math.fabs(position_x) - 0.25 > borders or math.fabs(position_z) - 0.25 > borders:
             return True
         else:
-            left_collide = self._shown.get((position_x_left, 0, get_int_from_float(z))) is not None
-            right_collide = self._shown.get(
-                (position_x_right, 0, get_int_from_float(z))) is not None
-            top_collide = self._shown.get((get_int_from_float(x), 0, position_z_top)) is not None
-            bottom_collide = self._shown.get(
-                (get_int_from_float(x), 0, position_z_bottom)) is not None
-
-            return left_collide or right_collide or top_collide or bottom_collide
+            # left, right, top and bottom side of the figure
+            return self.grid.any_occupied((position_x_left, position_x_right, x, x),
+                                          (z, z, position_z_top, position_z_bottom))
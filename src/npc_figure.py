@@ -2,6 +2,7 @@ from src.figure import BaseFigure
 
 
 class NPCFigure(BaseFigure):
-    def __init__(self, position_x, position_z):
-        super(self.__class__, self).__init__(position_x, position_z)
+    def __init__(self, position_x, position_z, config=None):
+        super(self.__class__, self).__init__(position_x, position_z, config)
         self.escaping_to = None
+        self.escape_path = None
@@ -0,0 +1,111 @@
+import numpy as np
+
+from src.game_config import HALF_OF_FIELD_SIZE, TRACING_GRASS_CONSTANT
+from src.textures import GRASS
+
+EMPTY_CELL = 0
+GRASS_CELL = 1
+STONE_CELL = 2
+
+
+class OccupancyGrid:
+    """ Compact 2D representation of the blocks shown on the ground level
+    (y = 0) of the game field. Cell (x, z) of the field is stored at index
+    [x + half_size, z + half_size].
+
+    Parameters
+    ----------
+    half_size : int
+        Half of the field size, the grid covers cells -half_size..half_size.
+    grass_cost : int
+        Cost of entering a cell with grass.
+
+    """
+
+    def __init__(self, half_size=HALF_OF_FIELD_SIZE, grass_cost=TRACING_GRASS_CONSTANT):
+        self.half_size = half_size
+
+        # Cost of entering a cell indexed by its content, 0 means the cell can not be entered.
+        self.entry_costs = np.array([1, grass_cost, 0], dtype=np.int16)
+
+        self.cells = np.zeros((half_size * 2 + 1, half_size * 2 + 1), dtype=np.int8)
+
+    def is_inside(self, x, z):
+        return -self.half_size <= x <= self.half_size and -self.half_size <= z <= self.half_size
+
+    def get(self, x, z):
+        """ Return content of the cell at `x`, `z`. Cells outside of the field
+        are treated as stone.
+
+        """
+        if not self.is_inside(x, z):
+            return STONE_CELL
+
+        return self.cells.item(x + self.half_size, z + self.half_size)
+
+    def set_block(self, x, z, texture):
+        """ Mark cell at `x`, `z` as occupied by block with given `texture`,
+        or as empty if `texture` is None.
+
+        """
+        if texture is None:
+            value = EMPTY_CELL
+        elif texture == GRASS:
+            value = GRASS_CELL
+        else:
+            value = STONE_CELL
+
+        self.cells[x + self.half_size, z + self.half_size] = value
+
+    def any_occupied(self, xs, zs):
+        """ Return True if any of cells given by coordinate sequences `xs` and
+        `zs` is occupied by a block.
+
+        """
+        for x, z in zip(xs, zs):
+            if self.cells.item(x + self.half_size, z + self.half_size) != EMPTY_CELL:
+                return True
+
+        return False
+
+    def blast_ray(self, x, z, dx, dz, length, blocking=GRASS_CELL):
+        """ Return list of (x, z) cells covered by a ray starting at `x`, `z`
+        and going `length` cells in direction `dx`, `dz`. The ray stops before
+        the first cell with content greater or equal to `blocking` or at the
+        border of the field.
+
+        """
+        result = []
+
+        for step in range(length):
+            ray_x, ray_z = x + dx * step, z + dz * step
+
+            if not self.is_inside(ray_x, ray_z) or \
+               self.cells.item(ray_x + self.half_size, ray_z + self.half_size) >= blocking:
+                break
+
+            result.append((ray_x, ray_z))
+
+        return result
+
+    def entry_cost(self, x, z):
+        """ Return cost of entering cell at `x`, `z`, 0 if it can not be
+        entered.
+
+        """
+        return int(self.entry_costs[self.get(x, z)])
+
+    def neighbour_entry_costs(self, dx, dz):
+        """ Return array where item at index of cell (x, z) holds cost of
+        entering its neighbour (x + dx, z + dz), 0 if the neighbour can not be
+        entered or lies outside of the field.
+
+        """
+        costs = self.entry_costs[self.cells]
+        result = np.zeros_like(costs)
+        size = self.cells.shape[0]
+
+        result[max(0, -dx):size - max(0, dx), max(0, -dz):size - max(0, dz)] = \
+            costs[max(0, dx):size - max(0, -dx), max(0, dz):size - max(0, -dz)]
+
+        return result
@@ -1,102 +1,235 @@
-# fire.py
-# by Dave Pape, for DMS 423
-#
-# Example particle system for a simple fire-like effect
-# This code is intended as a trivial introduction to particle systems and
-# graphics programming; it is NOT intended to be optimal; many values are
-# hard-coded for simplicity.
-#
-# Requires: pyglet (http://www.pyglet.org/), euclid (https://code.google.com/p/pyeuclid/),
-#    and a texture image fireparticle.png
-
-import sys, time, math
-from pyglet.gl import *
-from euclid import *
-from random import *
-
-window = pyglet.window.Window()
-
-
-gravity = Vector3(0, -2, 0)
-tex = pyglet.image.load('C:\\Users\Krystof\PycharmProjects\Bomberman\\venv\spark.png').get_texture()
-
-
-class particle:
-
-
-    #pyglet.gl.glEnable(pyglet.gl.GL_BLEND)
-    #pyglet.gl.glBlendFunc(pyglet.gl.GL_SRC_ALPHA, pyglet.gl.GL_ONE_MINUS_SRC_ALPHA)
-
-
-    def __init__(self, pos):
-        self.pos = pos.copy()
-        self.pos[0] += gauss(0,25)
-        self.pos[1] += uniform(0,40)
-        self.vel = Vector3(uniform(-20,20), 300+gauss(0,50), 0)
-        self.removeTime = time.time() + abs(gauss(0.0,0.25))
-    def update(self, dt):
-        self.pos += self.vel * dt
-        self.vel += gravity * dt
-
-
-class particleSystem:
-    def __init__(self, num=1):
-        self.particles = []
-        self.addParticles(num)
-    def addParticles(self, num):
-        for i in range(0,num):
-            p = particle(Vector3(300,100,0))
-            self.particles.append(p)
-    def draw(self):
-        glColor3f(1,1,1)
-        glEnable(tex.target)
-        glBindTexture(tex.target, tex.id)
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
-        glBegin(GL_QUADS)
-        for p in self.particles:
-            size = 20
-            glTexCoord2f(0, 0)
-            glVertex3f(p.pos[0]-size, p.pos[1]-size, p.pos[2])
-            glTexCoord2f(1,0)
-            glVertex3f(p.pos[0]+size, p.pos[1]-size, p.pos[2])
-            glTexCoord2f(1,1)
-            glVertex3f(p.pos[0]+size, p.pos[1]+size, p.pos[2])
-            glTexCoord2f(0,1)
-            glVertex3f(p.pos[0]-size, p.pos[1]+size, p.pos[2])
-        glEnd()
-        glDisable(GL_BLEND)
-        glDisable(tex.target)
-
-    def update(self, dt):
-        for p in self.particles:
-            p.update(dt)
-        t = time.time()
-        for i in range(len(self.particles)-1, -1, -1):
-            if (self.particles[i].removeTime <= t) or (self.particles[i].pos[1] < 0):
-                del self.particles[i]
-                self.addParticles(1)
-        #print(time.clock())
-
-
-systems = [particleSystem(100)]
-
-
-@window.event
-def on_draw():
-    glClear(GL_COLOR_BUFFER_BIT)
-    for s in systems:
-        s.draw()
-
-
-def update(dt):
-    for s in systems:
-        s.update(dt)
-    for i in range(len(systems)-1, -1, -1):
-        if len(systems[i].particles) == 0:
-            del systems[i]
-    if time.process_time() > 2:
-        return True
-
-pyglet.clock.schedule_interval(update,1/40.0)
-pyglet.app.run()
\ No newline at end of file
+import numpy as np
+
+from src.game_config import PARTICLE_CAPACITY, PARTICLE_GRAVITY, SPARK_SPEED, SPARK_LIFETIME_SECS, \
+    PARTICLE_GROUND_LEVEL
+
+
+class ParticleSystem(object):
+    """ Fixed size pool of particles stored as a structure of arrays, one
+    row per particle, so they are spawned, moved and removed in batch by
+    numpy.
+
+    Live particles occupy rows [0, count) of the arrays, rows after them
+    are free and reused by `emit()`. All arrays, including scratch space,
+    are allocated once, so spawning and updating particles allocates no
+    memory per frame.
+
+    Parameters
+    ----------
+    capacity : int
+        Maximal count of live particles, further particles are not spawned.
+    gravity : float
+        Vertical acceleration of all particles.
+    seed : int
+        Seed of the random generator spreading spawned particles.
+
+    """
+
+    def __init__(self, capacity=PARTICLE_CAPACITY, gravity=PARTICLE_GRAVITY, seed=None):
+        self.capacity = capacity
+        self.gravity = gravity
+        self.random = np.random.default_rng(seed)
+
+        # Count of live particles.
+        self.count = 0
+
+        self.positions = np.zeros((capacity, 3), dtype=np.float32)
+        self.velocities = np.zeros((capacity, 3), dtype=np.float32)
+
+        # Seconds each particle has lived and may live at most.
+        self.ages = np.zeros(capacity, dtype=np.float32)
+        self.lifetimes = np.zeros(capacity, dtype=np.float32)
+
+        # RGBA color of each particle, filled by `get_colors()`.
+        self.colors = np.zeros((capacity, 4), dtype=np.float32)
+
+        # Emitter which spawned each particle.
+        self.emitters = np.zeros(capacity, dtype=np.int32)
+
+        # Maximal count of live particles of each emitter, see `add_emitter()`.
+        self.budgets = []
+
+        # Scratch space of `emit()` and `update()`. The extra last row takes
+        # writes of removed particles in `_compact()`.
+        self._vectors = np.zeros((capacity + 1, 3), dtype=np.float32)
+        self._scalars = np.zeros(capacity + 1, dtype=np.float32)
+        self._emitters = np.zeros(capacity + 1, dtype=np.int32)
+        self._targets = np.zeros(capacity, dtype=np.intp)
+        self._dead = np.zeros(capacity, dtype=bool)
+        self._below_ground = np.zeros(capacity, dtype=bool)
+
+        # Emitter used by `emit()` by default, limited only by the capacity.
+        self.default_emitter = self.add_emitter()
+
+    def __len__(self):
+        return self.count
+
+    def add_emitter(self, budget=None):
+        """ Register an emitter which may have at most `budget` live
+        particles, the whole capacity if None.
+
+        Returns
+        -------
+        emitter : int
+            Identifier of the emitter passed to `emit()`.
+
+        """
+        self.budgets.append(self.capacity if budget is None else min(budget, self.capacity))
+
+        return len(self.budgets) - 1
+
+    def get_emitter_count(self, emitter):
+        """ Return count of live particles spawned by `emitter`.
+
+        """
+        matches = self._dead[:self.count]
+        np.equal(self.emitters[:self.count], emitter, out=matches)
+
+        return int(np.count_nonzero(matches))
+
+    def emit(self, origins, count, speed=SPARK_SPEED, lifetime=SPARK_LIFETIME_SECS, emitter=None):
+        """ Spawn `count` particles at each of `origins`, flying upwards in
+        random directions. Fewer particles are spawned at each origin if
+        the pool or the budget of `emitter` would overflow.
+
+        Parameters
+        ----------
+        origins : sequence of tuples of len 3
+            The (x, y, z) positions to spawn particles at.
+        count : int
+            Count of particles spawned at each origin.
+        speed : float
+            Maximal initial speed of a particle.
+        lifetime : float
+            Maximal lifetime of a particle in seconds.
+        emitter : int
+            Emitter returned by `add_emitter()`, `default_emitter` if None.
+
+        Returns
+        -------
+        spawned : int
+            Count of spawned particles.
+
+        """
+        if emitter is None:
+            emitter = self.default_emitter
+
+        origins = np.asarray(origins, dtype=np.float32).reshape(-1, 3)
+
+        if not len(origins):
+            return 0
+
+        available = min(self.capacity - self.count, self.budgets[emitter] - self.get_emitter_count(emitter))
+        count = min(count, available // len(origins))
+
+        if count <= 0:
+            return 0
+
+        start, end = self.count, self.count + len(origins) * count
+
+        self.positions[start:end].reshape(len(origins), count, 3)[:] = origins[:, np.newaxis, :]
+
+        directions = self.velocities[start:end]
+        self.random.standard_normal(out=directions, dtype=np.float32)
+        np.abs(directions[:, 1], out=directions[:, 1])
+
+        # Directions are scaled to a random speed divided by their length in
+        # place, column by column, since broadcasting a column of factors
+        # over all columns makes numpy buffer the whole array.
+        squares = self._vectors[start:end]
+        lengths = squares[:, 0]
+        np.square(directions, out=squares)
+        np.add(lengths, squares[:, 1], out=lengths)
+        np.add(lengths, squares[:, 2], out=lengths)
+        np.sqrt(lengths, out=lengths)
+        np.maximum(lengths, 1e-6, out=lengths)
+
+        factors = self._scalars[start:end]
+        self.random.random(out=factors, dtype=np.float32)
+        factors *= 0.8 * speed
+        factors += 0.2 * speed
+        factors /= lengths
+
+        for axis in range(3):
+            directions[:, axis] *= factors
+
+        self.random.random(out=self.lifetimes[start:end], dtype=np.float32)
+        self.lifetimes[start:end] *= 0.5 * lifetime
+        self.lifetimes[start:end] += 0.5 * lifetime
+
+        self.ages[start:end] = 0.0
+        self.emitters[start:end] = emitter
+        self.count = end
+
+        return end - start
+
+    def update(self, dt):
+        """ Move all particles by `dt` seconds and recycle those which
+        outlived their lifetime or fell under the ground.
+
+        """
+        count = self.count
+
+        if not count:
+            return
+
+        positions, velocities = self.positions[:count], self.velocities[:count]
+
+        velocities[:, 1] += self.gravity * dt
+        np.multiply(velocities, dt, out=self._vectors[:count])
+        positions += self._vectors[:count]
+        self.ages[:count] += dt
+
+        dead, below_ground = self._dead[:count], self._below_ground[:count]
+        np.greater_equal(self.ages[:count], self.lifetimes[:count], out=dead)
+        np.less_equal(positions[:, 1], PARTICLE_GROUND_LEVEL, out=below_ground)
+        np.logical_or(dead, below_ground, out=dead)
+
+        if dead.any():
+            self._compact(dead)
+
+    def _compact(self, dead):
+        """ Move live particles to the front of the arrays, keeping their
+        order, and free rows of particles given by mask `dead`.
+
+        """
+        count = len(dead)
+        live_count = count - int(np.count_nonzero(dead))
+
+        # Row each particle moves to, the running count of live particles
+        # before it. Dead particles are written to the extra scratch row.
+        targets = self._targets[:count]
+        targets.fill(1)
+        np.copyto(targets, 0, where=dead)
+        np.cumsum(targets, out=targets)
+        targets -= 1
+        np.copyto(targets, self.capacity, where=dead)
+
+        for data, scratch in ((self.positions, self._vectors), (self.velocities, self._vectors),
+                              (self.ages, self._scalars), (self.lifetimes, self._scalars),
+                              (self.emitters, self._emitters)):
+            scratch[targets] = data[:count]
+            data[:live_count] = scratch[:live_count]
+
+        self.count = live_count
+
+    def get_colors(self):
+        """ Return float32 array of shape (count, 4) with RGBA color of each
+        live particle, fading from yellow to transparent red as it ages. The
+        array is a view of `colors` overwritten by the next call.
+
+        """
+        count = self.count
+        remaining = self._scalars[:count]
+        colors = self.colors[:count]
+
+        np.divide(self.ages[:count], self.lifetimes[:count], out=remaining)
+        np.subtract(1.0, remaining, out=remaining)
+
+        colors[:, 0] = 1.0
+        np.multiply(remaining, 0.9, out=colors[:, 1])
+        np.multiply(remaining, remaining, out=colors[:, 2])
+        colors[:, 2] *= 0.2
+        colors[:, 3] = remaining
+
+        return colors
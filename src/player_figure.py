@@ -2,5 +2,5 @@ from src.figure import BaseFigure
 
 
 class PlayerFigure(BaseFigure):
-    def __init__(self, position_x, position_z):
-        super(self.__class__, self).__init__(position_x, position_z)
+    def __init__(self, position_x, position_z, config=None):
+        super(self.__class__, self).__init__(position_x, position_z, config)
@@ -0,0 +1,110 @@
+import csv
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+from src.game_config import PROFILER_WINDOW_FRAMES, PROFILER_HISTORY_FRAMES
+
+
+class Profiler(object):
+    """ Collects time spent in named sections of code per frame.
+
+    Time measured by `measure()` is summed per section until `end_frame()`
+    closes the frame. Percentiles are computed over the last
+    `window_frames` frames, `dump_csv()` writes up to `history_frames`
+    frames.
+
+    """
+
+    def __init__(self, enabled=True, window_frames=PROFILER_WINDOW_FRAMES, history_frames=PROFILER_HISTORY_FRAMES):
+        self.enabled = enabled
+
+        # Names of all sections measured so far, in order of first use.
+        self.sections = []
+
+        # Mapping from section name to seconds spent in the current frame.
+        self._current = {}
+
+        # Closed frames as tuples (frame number, mapping from section name to seconds).
+        self.frames = deque(maxlen=history_frames)
+
+        # Sections of the last `window_frames` frames.
+        self._window = deque(maxlen=window_frames)
+
+        # Count of frames closed so far.
+        self.frame_count = 0
+
+    @contextmanager
+    def measure(self, name):
+        """ Context manager adding time spent in its block to section `name`.
+
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+
+            if name not in self._current:
+                self._current[name] = 0.0
+
+                if name not in self.sections:
+                    self.sections.append(name)
+
+            self._current[name] += elapsed
+
+    def end_frame(self):
+        """ Close the current frame and start a new one.
+
+        """
+        if not self.enabled:
+            return
+
+        self.frames.append((self.frame_count, self._current))
+        self._window.append(self._current)
+        self.frame_count += 1
+        self._current = {}
+
+    def get_percentiles(self, name, percentiles=(50, 95, 99)):
+        """ Return percentiles of time in seconds spent in section `name` per
+        frame over the last `window_frames` frames.
+
+        """
+        if not self._window:
+            return tuple(0.0 for _ in percentiles)
+
+        samples = np.array([frame.get(name, 0.0) for frame in self._window])
+
+        return tuple(np.percentile(samples, percentiles))
+
+    def get_summary(self):
+        """ Return text with p50, p95 and p99 in milliseconds of each section,
+        one section per line.
+
+        """
+        lines = ['%-16s %7s %7s %7s' % ('ms / frame', 'p50', 'p95', 'p99')]
+
+        for name in self.sections:
+            p50, p95, p99 = self.get_percentiles(name)
+            lines.append('%-16s %7.3f %7.3f %7.3f' % (name, p50 * 1000, p95 * 1000, p99 * 1000))
+
+        return '\n'.join(lines)
+
+    def dump_csv(self, path):
+        """ Write all kept frames to CSV file at `path`, one row per frame
+        with seconds spent in each section.
+
+        """
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(['frame'] + self.sections)
+
+            for number, frame in self.frames:
+                writer.writerow([number] + [frame.get(name, 0.0) for name in self.sections])
@@ -0,0 +1,259 @@
+from src.basic_helpers import get_int_from_float
+from src.game_field import GameField
+
+GAME_WON = 'win'
+GAME_LOST = 'loss'
+
+
+class Simulation(object):
+    """ Game logic of one match, independent of any window or OpenGL context.
+    The state lives in `field` and is advanced by calling `step()`.
+
+    """
+
+    def __init__(self, field=None, config=None):
+        self.field = field if field is not None else GameField(config=config)
+
+        # `GameConfig` of the match, shared with `field`.
+        self.config = self.field.config
+
+        # Strafing of the player figure, first element is 1 when moving to the
+        # right, -1 when moving to the left. The second element is 1 when moving
+        # to the top and -1 when moving to the bottom.
+        self.strafe = [0, 0]
+
+        self.player_wants_place_bomb = False
+
+        self.game_stopped = False
+
+        # GAME_WON or GAME_LOST once the match is decided, None otherwise.
+        self.result = None
+
+        # Count of steps run so far.
+        self.steps = 0
+
+    def game_win(self):
+        self.result = GAME_WON
+        self.game_stopped = True
+
+    def step(self, dt):
+        """ Advance the match by `dt` seconds of game time.
+
+        Parameters
+        ----------
+        dt : float
+            The change in time since the last call.
+
+        """
+        self.field.elapsed_time += dt
+        self.steps += 1
+
+        while self.field.bombs and self.field.bombs[0].detonation_time <= self.field.elapsed_time:
+            self.field.detonation(dt)
+
+        if all(figure.hit for figure in self.field.npc_figures):
+            self.game_win()
+        elif self.field.player_figure.hit:
+            # Hitting the player does not stop the game, the loss is only recorded.
+            self.result = GAME_LOST
+
+        self.move_figures(dt)
+        self.place_bombs()
+
+    def run(self, max_time=None, dt=None):
+        """ Step the match until it is decided or `max_time` seconds of game
+        time pass. Returns the result, None if the match is not decided.
+        Both `max_time` and step length `dt` default to the config.
+
+        """
+        if max_time is None:
+            max_time = self.config.match_max_secs
+
+        if dt is None:
+            dt = 1.0 / self.config.steps_per_sec
+
+        while self.result is None and self.field.elapsed_time < max_time:
+            self.step(dt)
+
+        return self.result
+
+    def move_figures(self, dt):
+        distance = dt * self.config.walking_speed  # distance covered this tick.
+
+        self.npcs_action(distance)
+
+        if self.strafe[0] != 0 or self.strafe[1] != 0:
+            new_x = self.field.player_figure.position_x
+            new_z = self.field.player_figure.position_z
+
+            if self.strafe[0] == 1:  # right
+                new_x += distance
+            elif self.strafe[0] == -1:
+                new_x -= distance
+
+            if self.strafe[1] == 1:  # top
+                new_z += distance
+            elif self.strafe[1] == -1:
+                new_z -= distance
+
+            if not self.field.check_if_figure_collide(new_x, new_z):
+                self.field.move_figure(self.field.player_figure, new_x, new_z)
+
+    def npcs_action(self, distance):
+        with self.field.profiler.measure('npcs_action'):
+            for figure in self.field.npc_figures:
+                running_away = False
+
+                if self.field.danger_map.is_dangerous(round(figure.position_x), round(figure.position_z)):
+                    running_away = self.escape_with_figure(figure, distance)
+
+                if not running_away:
+                    self.place_bombs_with_figure(figure, distance)
+
+    def place_bombs_with_figure(self, figure, distance):
+        coef = 0.5
+
+        x, z = self.field.tracing_helper\
+            .get_direction_to((figure.position_x, 0, figure.position_z),
+                              (self.field.player_figure.position_x, 0, self.field.player_figure.position_z))
+
+        if x == -1:
+            rounded_x = round(figure.position_x - distance)
+
+            if not self.field.check_if_figure_collide(rounded_x - coef, figure.position_z) and \
+               not self.is_position_affected_by_any_bomb(rounded_x, figure.position_z):
+                self.field.move_figure(figure, figure.position_x - distance, figure.position_z)
+            else:
+                return self.npc_place_bomb(figure)
+
+        if x == 1:
+            rounded_x = round(figure.position_x + distance)
+
+            if not self.field.check_if_figure_collide(rounded_x + coef, figure.position_z) and \
+               not self.is_position_affected_by_any_bomb(rounded_x, figure.position_z):
+                self.field.move_figure(figure, figure.position_x + distance, figure.position_z)
+            else:
+                return self.npc_place_bomb(figure)
+
+        if z == -1:
+            rounded_z = round(figure.position_z - distance)
+
+            if not self.field.check_if_figure_collide(figure.position_x, rounded_z - coef) and \
+               not self.is_position_affected_by_any_bomb(figure.position_x, rounded_z):
+                self.field.move_figure(figure, figure.position_x, figure.position_z - distance)
+            else:
+                return self.npc_place_bomb(figure)
+
+        if z == 1:
+            rounded_z = round(figure.position_z + distance)
+
+            if not self.field.check_if_figure_collide(figure.position_x, rounded_z + coef) and \
+               not self.is_position_affected_by_any_bomb(figure.position_x, rounded_z):
+                self.field.move_figure(figure, figure.position_x, figure.position_z + distance)
+            else:
+                return self.npc_place_bomb(figure)
+
+    def is_position_affected_by_any_bomb(self, x, z):
+        return self.field.danger_map.is_dangerous(round(x), round(z))
+
+    def escape_with_figure(self, figure, distance):
+        coef = 0
+
+        if figure.escaping_to is None:
+            figure.escape_path = self.find_escape_path(figure)
+
+            if not figure.escape_path:
+                return True
+
+            figure.escaping_to = figure.escape_path[-1]
+
+        current_vertex = self.get_path_vertex(figure)
+
+        if figure.escape_path and current_vertex in figure.escape_path:
+            while figure.escape_path[0] != current_vertex:
+                figure.escape_path.popleft()
+
+            path = figure.escape_path
+        else:
+            path = self.field.tracing_helper.do_dijkstra(current_vertex, figure.escaping_to)
+
+        x, z = self.field.tracing_helper.get_direction_from_path(path)
+
+        if x == 0 and z == 0:
+            if round(figure.position_x) != figure.escaping_to[0] or \
+               round(figure.position_z) != figure.escaping_to[2]:
+                x, z = figure.previous_direction
+            else:
+                return False
+
+        figure.previous_direction = x, z
+
+        if x == -1:
+            rounded_x = round(figure.position_x - distance)
+
+            if not self.field.check_if_figure_collide(rounded_x - coef, figure.position_z):
+                self.field.move_figure(figure, figure.position_x - distance, figure.position_z)
+                return True
+
+        if x == 1:
+            rounded_x = round(figure.position_x + distance)
+
+            if not self.field.check_if_figure_collide(rounded_x + coef, figure.position_z):
+                self.field.move_figure(figure, figure.position_x + distance, figure.position_z)
+                return True
+
+        if z == -1:
+            rounded_z = round(figure.position_z - distance)
+
+            if not self.field.check_if_figure_collide(figure.position_x, rounded_z - coef):
+                self.field.move_figure(figure, figure.position_x, figure.position_z - distance)
+                return True
+
+        if z == 1:
+            rounded_z = round(figure.position_z + distance)
+
+            if not self.field.check_if_figure_collide(figure.position_x, rounded_z + coef):
+                self.field.move_figure(figure, figure.position_x, figure.position_z + distance)
+                return True
+
+        return False
+
+    @staticmethod
+    def get_path_vertex(figure):
+        """ Return vertex of the cell `figure` follows its paths from. The
+        position is truncated toward zero as in the rest of the steering,
+        rounding a figure standing on the border of two cells may give a
+        cell it can not walk out of.
+
+        """
+        return get_int_from_float(figure.position_x), 0, get_int_from_float(figure.position_z)
+
+    def find_escape_path(self, figure):
+        """ Return path from the cell of `figure` to the nearest reachable
+        cell not affected by any bomb, empty if there is no such cell. The
+        path starts at `get_path_vertex()`, so `escape_with_figure()` finds
+        the figure on it.
+
+        """
+        danger_map = self.field.danger_map
+
+        return self.field.tracing_helper.find_nearest(self.get_path_vertex(figure),
+                                                      lambda vertex: not danger_map.is_dangerous(vertex[0], vertex[2]))
+
+    def place_bombs(self):
+        if self.player_wants_place_bomb and not self.game_stopped:
+            new_bomb = self.field.player_figure.place_bomb()
+
+            if new_bomb is not None:  # Can be None in case of unable to place bomb
+                self.field.add_bomb(new_bomb)
+
+        self.player_wants_place_bomb = False
+
+    def npc_place_bomb(self, figure):
+        if not self.game_stopped:
+            new_bomb = figure.place_bomb()
+
+            if new_bomb is not None:
+                self.field.add_bomb(new_bomb)
+
+                figure.previous_direction = None
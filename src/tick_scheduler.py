@@ -0,0 +1,95 @@
+import time
+
+from src.game_config import TICKS_PER_SEC, SUBSTEPS_PER_TICK, MAX_CATCH_UP_SECS
+
+
+class TickScheduler(object):
+    """ Fixed timestep scheduler. Real time passed to `tick()` is accumulated
+    and consumed in steps of constant length, so the simulation advances the
+    same way regardless of frame rate jitter.
+
+    Parameters
+    ----------
+    step : callable
+        Called with the fixed step length in seconds for every step.
+    steps_per_sec : int
+        Count of steps per second of game time.
+    max_catch_up_secs : float
+        Maximal game time simulated in a single tick, time over this limit is
+        dropped so a long hitch does not stall the following frames.
+    budget : float
+        Real time in seconds a tick may take before it is counted as overrun.
+
+    """
+
+    def __init__(self, step, steps_per_sec=TICKS_PER_SEC * SUBSTEPS_PER_TICK, max_catch_up_secs=MAX_CATCH_UP_SECS,
+                 budget=1.0 / TICKS_PER_SEC):
+        self.step = step
+        self.step_dt = 1.0 / steps_per_sec
+        self.max_steps_per_tick = max(1, int(round(max_catch_up_secs * steps_per_sec)))
+        self.budget = budget
+
+        # Real time not yet consumed by steps.
+        self.accumulator = 0.0
+
+        self.ticks = 0
+        self.steps = 0
+        self.overruns = 0
+        self.dropped_time = 0.0
+        self.total_tick_time = 0.0
+        self.max_tick_time = 0.0
+
+    def tick(self, dt):
+        """ Run as many fixed steps as fit into accumulated time.
+
+        Parameters
+        ----------
+        dt : float
+            The change in time since the last call.
+
+        Returns
+        -------
+        steps : int
+            Count of steps run.
+
+        """
+        start = time.perf_counter()
+
+        self.accumulator += dt
+        steps = 0
+
+        while self.accumulator >= self.step_dt and steps < self.max_steps_per_tick:
+            self.step(self.step_dt)
+            self.accumulator -= self.step_dt
+            steps += 1
+
+        if self.accumulator >= self.step_dt:
+            dropped = self.accumulator - self.accumulator % self.step_dt
+            self.dropped_time += dropped
+            self.accumulator -= dropped
+
+        tick_time = time.perf_counter() - start
+
+        self.ticks += 1
+        self.steps += steps
+        self.total_tick_time += tick_time
+        self.max_tick_time = max(self.max_tick_time, tick_time)
+
+        if tick_time > self.budget:
+            self.overruns += 1
+
+        return steps
+
+    def get_statistics(self):
+        """ Return dictionary with counts of ticks, steps and overruns, game
+        time dropped by catch up limit and real time spent in ticks.
+
+        """
+        return {
+            'ticks': self.ticks,
+            'steps': self.steps,
+            'overruns': self.overruns,
+            'dropped_time': self.dropped_time,
+            'mean_tick_time': self.total_tick_time / self.ticks if self.ticks else 0.0,
+            'max_tick_time': self.max_tick_time,
+        }
@@ -1,66 +1,104 @@
+import heapq
 import math
-from collections import namedtuple, deque
+from collections import namedtuple, deque, OrderedDict
 from src.basic_helpers import get_positions_list
-from src.game_config import TRACING_GRASS_CONSTANT, HALF_OF_FIELD_SIZE
-from src.textures import *
+from src.occupancy_grid import EMPTY_CELL
 
 Edge = namedtuple('Edge', 'start_z, start_x, end_z, end_x, cost')
 
+NEIGHBOUR_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
 
 def make_edge(start_z, start_x, end_z, end_x, cost=1):
     return Edge(start_z, start_x, end_z, end_x, cost)
 
 
 class TracingHelper:
-    def __init__(self, game_field):
+    def __init__(self, game_field, config):
         self.game_field = game_field
+        self.config = config
         self.quantified_game_field = None
         self._neighbours = None
-        self.vertices = get_positions_list()
+        self.vertices = get_positions_list(config.half_of_field_size)
+        self._vertices_set = set(self.vertices)
+
+        # Incremented whenever the game field changes, see `update_cells()`.
+        self.board_version = 0
+
+        # Mapping from (start, destination) to (board_version, path as a tuple), ordered from least to most
+        # recently used. Callers get a new deque of the path, so they may consume it.
+        self._path_cache = OrderedDict()
+
+        # Last computed distance field as tuple (board_version, destination, distances).
+        self._distance_field = None
 
     def quantify_game_field(self):
-        self.quantified_game_field = []
-
-        for position in self.vertices:
-            x, y, z = position
-
-            dx = x - 1
-            if math.fabs(dx) <= HALF_OF_FIELD_SIZE:
-                block = self.game_field.shown.get((dx, 0, z))
-                if block is not None:
-                    if block == GRASS:
-                        self.quantified_game_field.append(make_edge(z, x, z, dx, TRACING_GRASS_CONSTANT))
-                else:
-                    self.quantified_game_field.append(make_edge(z, x, z, dx))
-
-            dx = x + 1
-            if math.fabs(dx) <= HALF_OF_FIELD_SIZE:
-                block = self.game_field.shown.get((dx, 0, z))
-                if block is not None:
-                    if block == GRASS:
-                        self.quantified_game_field.append(make_edge(z, x, z, dx, TRACING_GRASS_CONSTANT))
-                else:
-                    self.quantified_game_field.append(make_edge(z, x, z, dx))
-
-            dz = z - 1
-            if math.fabs(dz) <= HALF_OF_FIELD_SIZE:
-                block = self.game_field.shown.get((x, 0, dz))
-                if block is not None:
-                    if block == GRASS:
-                        self.quantified_game_field.append(make_edge(z, x, dz, x, TRACING_GRASS_CONSTANT))
-                else:
-                    self.quantified_game_field.append(make_edge(z, x, dz, x))
-
-            dz = z + 1
-            if math.fabs(dz) <= HALF_OF_FIELD_SIZE:
-                block = self.game_field.shown.get((x, 0, dz))
-                if block is not None:
-                    if block == GRASS:
-                        self.quantified_game_field.append(make_edge(z, x, dz, x, TRACING_GRASS_CONSTANT))
-                else:
-                    self.quantified_game_field.append(make_edge(z, x, dz, x))
-
-        pass
+        grid = self.game_field.grid
+        n = grid.half_size
+
+        self.quantified_game_field = {vertex: [] for vertex in self.vertices}
+
+        for dx, dz in NEIGHBOUR_OFFSETS:
+            costs = grid.neighbour_entry_costs(dx, dz)
+            xs, zs = costs.nonzero()
+
+            for x, z, cost in zip((xs - n).tolist(), (zs - n).tolist(), costs[xs, zs].tolist()):
+                self.quantified_game_field[(x, 0, z)].append(make_edge(z, x, z + dz, x + dx, cost))
+
+        self._neighbours = None
+
+    def quantify_vertex(self, position):
+        """ Return list of edges leading from `position` to its neighbours.
+        Cost of an edge depends on the block the edge leads to.
+
+        """
+        x, y, z = position
+        edges = []
+
+        for dx, dz in NEIGHBOUR_OFFSETS:
+            cost = self.game_field.grid.entry_cost(x + dx, z + dz)
+
+            if cost > 0:
+                edges.append(make_edge(z, x, z + dz, x + dx, cost))
+
+        return edges
+
+    def update_cells(self, positions):
+        """ Patch edges around blocks at given `positions` which were shown or
+        hidden, instead of quantifying the whole game field again.
+
+        Parameters
+        ----------
+        positions : iterable of tuples of len 3
+            Positions of changed blocks.
+
+        """
+        changed = False
+
+        for x, y, z in positions:
+            if y != 0 or (x, y, z) not in self._vertices_set:
+                continue
+
+            changed = True
+
+            if not self.is_quantified:
+                continue
+
+            # Only edges leading into the changed cell depend on its block.
+            for dx, dz in NEIGHBOUR_OFFSETS:
+                vertex = (x + dx, 0, z + dz)
+
+                if vertex not in self.quantified_game_field:
+                    continue
+
+                edges = self.quantify_vertex(vertex)
+                self.quantified_game_field[vertex] = edges
+
+                if self._neighbours is not None:
+                    self._neighbours[vertex] = self._edges_to_neighbours(edges)
+
+        if changed:
+            self.board_version += 1
 
     @property
     def is_quantified(self):
@@ -69,14 +107,20 @@ class TracingHelper:
     @property
     def neighbours(self):
         if self._neighbours is None:
-            self._neighbours = {vertex: set() for vertex in self.vertices}
-
-            for edge in self.quantified_game_field:
-                self._neighbours[(edge.start_x, 0, edge.start_z)].add(((edge.end_x, 0, edge.end_z), edge.cost))
+            self._neighbours = {vertex: self._edges_to_neighbours(edges)
+                                for vertex, edges in self.quantified_game_field.items()}
 
         return self._neighbours
 
+    @staticmethod
+    def _edges_to_neighbours(edges):
+        return {((edge.end_x, 0, edge.end_z), edge.cost) for edge in edges}
+
     def do_dijkstra(self, start, destination):
+        with self.game_field.profiler.measure('do_dijkstra'):
+            return self._do_dijkstra(start, destination)
+
+    def _do_dijkstra(self, start, destination):
         if self.is_quantified is False:
             self.quantify_game_field()
 
@@ -86,36 +130,53 @@ class TracingHelper:
         x, y, z = destination
         destination = round(x), round(y), round(z)
 
-        assert start in self.vertices, 'source node not exists'
+        assert start in self.neighbours, 'source node not exists'
+
+        key = (start, destination)
+        cached = self._path_cache.get(key)
+
+        if cached is not None and cached[0] == self.board_version:
+            self._path_cache.move_to_end(key)
+            return deque(cached[1])
 
-        distances = {vertex: math.inf for vertex in self.vertices}
+        path = self._find_path(start, destination)
 
-        previous_vertices = {
-            vertex: None for vertex in self.vertices
-        }
+        self._path_cache[key] = (self.board_version, tuple(path))
 
-        distances[start] = 0
-        vertices = self.vertices.copy()
+        if len(self._path_cache) > self.config.path_cache_size:
+            self._path_cache.popitem(last=False)
 
-        while vertices:
-            current_vertex = min(
-                vertices, key=lambda vertex: distances[vertex])
+        return path
+
+    def _find_path(self, start, destination):
+        # Only vertices reached so far are stored, the rest is implicitly at infinite distance.
+        distances = {start: 0}
+        previous_vertices = {start: None}
+        settled = set()
+        heap = [(0, start)]
+
+        while heap:
+            distance, current_vertex = heapq.heappop(heap)
 
-            vertices.remove(current_vertex)
+            if current_vertex in settled:
+                continue  # stale heap entry, vertex was reached by a shorter route already
 
-            if distances[current_vertex] == math.inf:
+            settled.add(current_vertex)
+
+            if current_vertex == destination:
                 break
 
             for neighbour, cost in self.neighbours[current_vertex]:
-                alternative_route = distances[current_vertex] + cost
+                alternative_route = distance + cost
 
-                if alternative_route < distances[neighbour]:
+                if alternative_route < distances.get(neighbour, math.inf):
                     distances[neighbour] = alternative_route
                     previous_vertices[neighbour] = current_vertex
+                    heapq.heappush(heap, (alternative_route, neighbour))
 
         path, current_vertex = deque(), destination
 
-        while previous_vertices[current_vertex] is not None:
+        while previous_vertices.get(current_vertex) is not None:
             path.appendleft(current_vertex)
             current_vertex = previous_vertices[current_vertex]
 
@@ -124,6 +185,124 @@ class TracingHelper:
 
         return path
 
+    def get_distance_field(self, destination):
+        """ Return mapping from every vertex, from which `destination` is
+        reachable, to the cost of the shortest path to `destination`. The
+        field is computed once per board version and destination, so all
+        figures chasing the same target share it.
+
+        """
+        if self.is_quantified is False:
+            self.quantify_game_field()
+
+        x, y, z = destination
+        destination = round(x), round(y), round(z)
+
+        if self._distance_field is not None and \
+           self._distance_field[0] == self.board_version and self._distance_field[1] == destination:
+            return self._distance_field[2]
+
+        with self.game_field.profiler.measure('distance_field'):
+            distances = self._compute_distance_field(destination)
+
+        self._distance_field = (self.board_version, destination, distances)
+
+        return distances
+
+    def _compute_distance_field(self, destination):
+        # Dijkstra from the destination over reversed edges.
+        reversed_neighbours = {vertex: [] for vertex in self.neighbours}
+
+        for vertex, neighbours in self.neighbours.items():
+            for neighbour, cost in neighbours:
+                reversed_neighbours[neighbour].append((vertex, cost))
+
+        distances = {}
+        heap = [(0, destination)] if destination in reversed_neighbours else []
+
+        while heap:
+            distance, current_vertex = heapq.heappop(heap)
+
+            if current_vertex in distances:
+                continue
+
+            distances[current_vertex] = distance
+
+            for neighbour, cost in reversed_neighbours[current_vertex]:
+                if neighbour not in distances:
+                    heapq.heappush(heap, (distance + cost, neighbour))
+
+        return distances
+
+    def get_direction_to(self, start, destination):
+        """ Return (x, z) direction of the first step on the shortest path
+        from `start` to `destination`, or (0, 0) when `start` is already at
+        `destination` or `destination` is not reachable.
+
+        """
+        distances = self.get_distance_field(destination)
+
+        x, y, z = start
+        start = round(x), round(y), round(z)
+
+        assert start in self.neighbours, 'source node not exists'
+
+        if distances.get(start, 0) == 0:
+            return 0, 0
+
+        next_vertex = min(((distances[neighbour] + cost, neighbour)
+                           for neighbour, cost in self.neighbours[start] if neighbour in distances))[1]
+
+        return next_vertex[0] - start[0], next_vertex[2] - start[2]
+
+    def find_nearest(self, start, is_target):
+        """ Breadth first search from `start` over cells without blocks.
+
+        Parameters
+        ----------
+        start : tuple of len 3
+            Position to search from, it is rounded to the nearest vertex.
+        is_target : callable
+            Called with a vertex, returns True if the vertex is acceptable.
+
+        Returns
+        -------
+        path : deque of tuples of len 3
+            Vertices from `start` to the nearest acceptable vertex, both
+            included. Empty if no acceptable vertex is reachable.
+
+        """
+        grid = self.game_field.grid
+
+        x, y, z = start
+        start = round(x), round(y), round(z)
+
+        previous_vertices = {start: None}
+        queue = deque([start])
+
+        while queue:
+            current_vertex = queue.popleft()
+
+            if is_target(current_vertex):
+                path = deque()
+
+                while current_vertex is not None:
+                    path.appendleft(current_vertex)
+                    current_vertex = previous_vertices[current_vertex]
+
+                return path
+
+            x, y, z = current_vertex
+
+            for dx, dz in NEIGHBOUR_OFFSETS:
+                neighbour = (x + dx, 0, z + dz)
+
+                if neighbour not in previous_vertices and grid.get(x + dx, z + dz) == EMPTY_CELL:
+                    previous_vertices[neighbour] = current_vertex
+                    queue.append(neighbour)
+
+        return deque()
+
     def get_direction_from_path(self, path):
         if len(list(path)) < 2:
             return 0, 0